@@ -5,57 +5,136 @@ A clean framework for any OpenAI-compatible API provider.
 Works with: CLIProxy, OpenAI, Anthropic proxy, local servers, etc.
 """
 import os
-import json
+import io
+import mmap
+import asyncio
+import functools
+from collections import OrderedDict
+import orjson
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
 import base64
 from typing import Optional, Callable, Dict, Any, List
 from pathlib import Path
 
+try:
+    import brotli  # noqa: F401 - lets requests/httpx decode br responses
+    ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
+
 from agent.brain import Brain, ThinkResult
-from tools import STRUCTURED_TOOLS, TOOL_REGISTRY
-from tools.schemas import TOOL_SCHEMAS
+from agent.tool_struct import pydantic_to_openai_schema  # re-exported
+from core.ui_cache import invalidate_ui_cache
+from tools import READ_ONLY_TOOLS, TOOL_ENTRIES, resolve_tool
 
 
 # ============================================================
 # Tool Schema Converter
 # ============================================================
 
-def pydantic_to_openai_schema(model) -> dict:
-    """Convert Pydantic model to OpenAI function schema."""
-    schema = model.model_json_schema()
-    return {
-        "type": "object",
-        "properties": schema.get("properties", {}),
-        "required": schema.get("required", [])
-    }
-
-
 def build_openai_tools() -> List[dict]:
     """Build OpenAI-format tool definitions from registry."""
-    tools = []
-    for name, func in TOOL_REGISTRY.items():
-        description = getattr(func, '__doc__', f"Tool: {name}") or f"Tool: {name}"
-        description = description.split('\n')[0]
-        
-        parameters = (
-            pydantic_to_openai_schema(TOOL_SCHEMAS[name])
-            if name in TOOL_SCHEMAS
-            else {"type": "object", "properties": {}, "required": []}
-        )
-        
-        tools.append({
-            "type": "function",
-            "function": {
-                "name": name,
-                "description": description,
-                "parameters": parameters
-            }
-        })
-    return tools
+    return [entry.openai_schema for entry in TOOL_ENTRIES.values()]
+
+
+@functools.lru_cache(maxsize=1)
+def _openai_tools() -> List[dict]:
+    return build_openai_tools()
+
+
+@functools.lru_cache(maxsize=1)
+def _tools_json_fragment() -> bytes:
+    """Serialized once - the tool block is identical on every request."""
+    return orjson.dumps(_openai_tools())
+
 
+def __getattr__(name: str):
+    # OPENAI_TOOLS is built on first access instead of at import
+    if name == "OPENAI_TOOLS":
+        return _openai_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Pre-build tools at import
-OPENAI_TOOLS = build_openai_tools()
+# Pending closes of replaced async clients (the loop only keeps weak refs)
+_CLOSING: set = set()
+
+
+def release_async_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    Close a pooled client bound to an event loop that is no longer current.
+    
+    The close runs on the client's own loop if it is still running,
+    otherwise on the current one; connections whose loop has already
+    closed are dropped with their sockets.
+    """
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    task = asyncio.get_running_loop().create_task(client.aclose())
+    _CLOSING.add(task)
+    task.add_done_callback(_closed)
+
+
+def _closed(task: asyncio.Task) -> None:
+    _CLOSING.discard(task)
+    if not task.cancelled():
+        task.exception()  # Retrieved: transports of a closed loop may fail to close
+
+
+# Shared keep-alive session for the blocking think() path
+_SESSION = requests.Session()
+_SESSION.headers.update({"Content-Type": "application/json", "Accept-Encoding": ACCEPT_ENCODING})
+_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64))
+
+
+# ============================================================
+# Image Encoding
+# ============================================================
+
+# Rough token accounting for history trimming (~4 chars per token)
+CHARS_PER_TOKEN = 4
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# Actions whose successful result needs no LLM follow-up turn
+_FIRE_AND_FORGET = frozenset({"press", "click_element", "swipe", "type_text", "open_app"})
+
+# Provider-side prompt caching marker (Anthropic/Gemini-compatible proxies)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+IMAGE_MEDIA_TYPES = {
+    ".png": "image/png", ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg", ".gif": "image/gif", ".webp": "image/webp"
+}
+
+
+@functools.lru_cache(maxsize=32)
+def _encode_image_url_cached(path: str, mtime: float, size: int, max_side: Optional[int]) -> str:
+    """
+    Encode image to data URL.
+    
+    Keyed on (path, mtime, size) so a re-sent screenshot is encoded once
+    and an overwritten file is picked up again.
+    """
+    media_type = IMAGE_MEDIA_TYPES.get(Path(path).suffix.lower(), "image/png")
+    
+    if max_side:
+        from PIL import Image
+        with Image.open(path) as img:
+            fmt = img.format or "PNG"
+            img.thumbnail((max_side, max_side))
+            buf = io.BytesIO()
+            img.save(buf, format=fmt)
+        data = base64.b64encode(buf.getbuffer())
+    elif size == 0:
+        data = b""
+    else:
+        # Encode straight from the mapped file, no intermediate bytes copy
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = base64.b64encode(mm)
+    
+    return f"data:{media_type};base64,{data.decode('ascii')}"
 
 
 # ============================================================
@@ -74,15 +153,30 @@ class CLIProxyBrain(Brain):
         base_url: API base URL (default: http://localhost:8317/v1)
         tool_callback: Optional callback for tool events (event, data) -> None
         system_prompt: Custom system prompt (optional)
+        max_image_side: Downscale screenshots to fit this many pixels before
+            upload (optional). Leave unset when the model reads tap
+            coordinates off the image, since downscaling changes them.
+        max_context_tokens: Estimated token budget for the history; oldest
+            turns are dropped beyond it (the system prompt is always kept)
+        supports_prompt_cache: Tag the stable prefix with cache_control so
+            the provider can reuse its KV cache across calls
+        supports_file_upload: Upload screenshots once via POST /files and
+            reference them by file_id instead of inlining base64
     """
     
+    MAX_UPLOADED_FILES = 128
+    
     def __init__(
         self, 
         api_key: str = None, 
         model_name: str = "gemini-2.5-flash",
         base_url: str = "http://localhost:8317/v1",
         tool_callback: Callable[[str, Dict[str, Any]], None] = None,
-        system_prompt: str = None
+        system_prompt: str = None,
+        max_image_side: Optional[int] = None,
+        max_context_tokens: int = 32000,
+        supports_prompt_cache: bool = False,
+        supports_file_upload: bool = False
     ):
         api_key = api_key or os.getenv("CLIPROXY_API_KEY", "")
         if not api_key:
@@ -94,8 +188,27 @@ class CLIProxyBrain(Brain):
         self.model_name = model_name
         self.tool_callback = tool_callback
         self.system_prompt = system_prompt or ""
+        self.max_image_side = max_image_side
+        self.max_context_tokens = max_context_tokens
+        self.supports_prompt_cache = supports_prompt_cache
+        self.supports_file_upload = supports_file_upload
+        
+        # Per-instance request constants for the shared keep-alive session
+        self._chat_url = f"{self.base_url}/chat/completions"
+        self._auth_headers = {"Authorization": f"Bearer {self.api_key}"}
+        
+        # (path, mtime) -> uploaded file_id
+        self._file_ids: "OrderedDict[tuple, str]" = OrderedDict()
         self.messages: List[dict] = []
         
+        # Async HTTP client (created lazily, bound to the running event loop)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Single-flight: identical concurrent think_async calls share one
+        # text-only response (see _call_api_coalesced)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        
         # Initialize with system message if provided
         if self.system_prompt:
             self.messages.append({
@@ -142,18 +255,145 @@ class CLIProxyBrain(Brain):
             
             # Handle tool calls
             if tool_calls:
-                return self._handle_tool_calls(assistant_msg, tool_calls)
+                result = self._handle_tool_calls(assistant_msg, tool_calls)
+            else:
+                # Text-only response
+                content = assistant_msg.get("content", "")
+                self.messages.append({"role": "assistant", "content": content})
+                result = ThinkResult(action="final_answer", content=content)
             
-            # Text-only response
-            content = assistant_msg.get("content", "")
-            self.messages.append({"role": "assistant", "content": content})
-            return ThinkResult(action="final_answer", content=content)
+            self._trim_history()
+            return result
+            
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return ThinkResult(action="error", content=str(e))
+    
+    async def think_async(
+        self,
+        user_request: str,
+        screenshot_path: Optional[str] = None,
+        ui_tree: Optional[str] = None,
+        persist: bool = True
+    ) -> ThinkResult:
+        """
+        Async variant of think() over a pooled httpx.AsyncClient.
+        
+        Each call works on its own copy of the conversation. With persist
+        (the default, like think()) a successful turn is then appended to
+        self.messages and the history trimmed; think_batch and
+        CloudAgent.chat_batch pass persist=False so concurrent calls do not
+        interleave their turns. Identical calls already in flight share the
+        model's first response if it is a text answer (see
+        _call_api_coalesced); tool calls are never shared.
+        """
+        messages = list(self.messages)
+        base = len(messages)
+        result = await self._think_async(messages, user_request, screenshot_path, ui_tree)
+        if persist and result.action != "error":
+            self.messages.extend(messages[base:])
+            self._trim_history()
+        return result
+    
+    async def _think_async(
+        self,
+        messages: List[dict],
+        user_request: str,
+        screenshot_path: Optional[str],
+        ui_tree: Optional[str]
+    ) -> ThinkResult:
+        """One think_async turn, appended to messages."""
+        try:
+            # stat + read + base64 of the screenshot would stall the event loop
+            user_content = await asyncio.to_thread(
+                self._build_user_content, user_request, screenshot_path, ui_tree
+            )
+            messages.append({"role": "user", "content": user_content})
+            
+            response = await self._call_api_coalesced((user_request, screenshot_path, ui_tree), messages)
+            if not response:
+                return ThinkResult(action="error", content="API call failed")
+            
+            assistant_msg = response.get("choices", [{}])[0].get("message", {})
+            tool_calls = assistant_msg.get("tool_calls", [])
+            
+            if not tool_calls:
+                content = assistant_msg.get("content", "")
+                messages.append({"role": "assistant", "content": content})
+                return ThinkResult(action="final_answer", content=content)
+            
+            # Tools are blocking device calls - keep them off the event loop
+            messages.append(assistant_msg)
+            last_tool_name, last_tool_args, can_skip = await asyncio.to_thread(
+                self._run_tool_calls, messages, tool_calls
+            )
+            
+            if can_skip:
+                return self._fire_and_forget_result(messages, last_tool_name, last_tool_args)
+            
+            final = await self._call_api_async(messages)
+            if final:
+                content = final.get("choices", [{}])[0].get("message", {}).get("content", "")
+                messages.append({"role": "assistant", "content": content})
+                return ThinkResult(
+                    action="final_answer",
+                    tool_name=last_tool_name,
+                    tool_args=last_tool_args,
+                    content=content
+                )
+            return ThinkResult(action="final_answer", content="Tool executed")
             
         except Exception as e:
             import traceback
             traceback.print_exc()
             return ThinkResult(action="error", content=str(e))
     
+    async def _call_api_coalesced(self, key: tuple, messages: List[dict]) -> Optional[dict]:
+        """
+        _call_api_async() shared by identical in-flight think_async calls.
+        
+        A follower only reuses the leader's response when it is a text
+        answer. Tool calls act on the device, so a response requesting them
+        (or a failed leader) makes the follower send its own request;
+        otherwise chat_batch(["press back", "press back"]) would press once.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                response = await asyncio.shield(inflight)
+            except Exception:
+                response = None
+            if response and not response.get("choices", [{}])[0].get("message", {}).get("tool_calls"):
+                return response
+            return await self._call_api_async(messages)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._call_api_async(messages)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            # Followers fall back to their own request rather than
+            # inheriting the leader's cancellation
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Coalesced request cancelled"))
+            future.exception()  # Mark retrieved when there are no followers
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def think_batch(self, user_requests: List[str]) -> List[ThinkResult]:
+        """Run several independent requests concurrently."""
+        return await asyncio.gather(*(self.think_async(r, persist=False) for r in user_requests))
+    
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+    
     def reset(self) -> None:
         """Reset conversation history."""
         self.messages = []
@@ -186,10 +426,7 @@ class CLIProxyBrain(Brain):
         
         # Add image
         if image_path and Path(image_path).exists():
-            parts.append({
-                "type": "image_url",
-                "image_url": {"url": self._encode_image_url(image_path)}
-            })
+            parts.append(self._image_part(image_path))
             print(f"👀 Vision: {image_path}")
         
         # Add UI tree context
@@ -202,39 +439,183 @@ class CLIProxyBrain(Brain):
         # Return simple string if text-only
         return text if len(parts) == 1 else parts
     
+    def _trim_history(self) -> None:
+        """
+        Drop the oldest turns while the history exceeds max_context_tokens.
+        
+        A turn is a user message plus everything up to the next user
+        message, so assistant tool_calls and their tool results are always
+        dropped together. The system prompt and the latest turn are kept.
+        """
+        start = 1 if self.messages and self.messages[0]["role"] == "system" else 0
+        
+        # Indices where each turn begins
+        turn_starts = [i for i in range(start, len(self.messages)) if self.messages[i]["role"] == "user"]
+        if len(turn_starts) < 2:
+            return
+        
+        total = sum(self._estimate_tokens(m) for m in self.messages)
+        drop_until = start
+        for next_start in turn_starts[1:]:
+            if total <= self.max_context_tokens:
+                break
+            total -= sum(self._estimate_tokens(m) for m in self.messages[drop_until:next_start])
+            drop_until = next_start
+        
+        if drop_until > start:
+            del self.messages[start:drop_until]
+    
+    @staticmethod
+    def _estimate_tokens(message: dict) -> int:
+        """Cheap token estimate for a chat message."""
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens = len(content) // CHARS_PER_TOKEN
+        else:
+            tokens = 0
+            for part in content:
+                if part.get("type") == "image_url":
+                    tokens += IMAGE_TOKEN_ESTIMATE
+                else:
+                    tokens += len(part.get("text", "")) // CHARS_PER_TOKEN
+        
+        if message.get("tool_calls"):
+            tokens += len(orjson.dumps(message["tool_calls"])) // CHARS_PER_TOKEN
+        return tokens
+    
+    def _image_part(self, path: str) -> dict:
+        """Build an image content part, by file_id when uploads are supported."""
+        if self.supports_file_upload:
+            file_id = self._upload_image(path)
+            if file_id:
+                return {"type": "image_url", "image_url": {"file_id": file_id}}
+        return {"type": "image_url", "image_url": {"url": self._encode_image_url(path)}}
+    
+    def _upload_image(self, path: str) -> Optional[str]:
+        """
+        Upload raw image bytes once per file version (multipart, no base64).
+        
+        Returns:
+            file_id, or None if the upload failed (caller falls back to inline)
+        """
+        key = (path, os.stat(path).st_mtime)
+        if key in self._file_ids:
+            self._file_ids.move_to_end(key)
+            return self._file_ids[key]
+        
+        media_type = IMAGE_MEDIA_TYPES.get(Path(path).suffix.lower(), "image/png")
+        try:
+            with open(path, "rb") as f:
+                response = _SESSION.post(
+                    f"{self.base_url}/files",
+                    # Drop the session's JSON Content-Type so requests sets multipart
+                    headers={**self._auth_headers, "Content-Type": None},
+                    data={"purpose": "vision"},
+                    files={"file": (Path(path).name, f, media_type)},
+                    timeout=60
+                )
+            response.raise_for_status()
+            file_id = orjson.loads(response.content)["id"]
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError, KeyError) as e:
+            print(f"⚠️ Image upload failed, sending inline: {e}")
+            return None
+        
+        self._file_ids[key] = file_id
+        if len(self._file_ids) > self.MAX_UPLOADED_FILES:
+            self._file_ids.popitem(last=False)
+        return file_id
+    
     def _encode_image_url(self, path: str) -> str:
-        """Encode image to data URL."""
-        with open(path, "rb") as f:
-            data = base64.b64encode(f.read()).decode("utf-8")
-        
-        ext = Path(path).suffix.lower()
-        media_types = {
-            ".png": "image/png", ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg", ".gif": "image/gif", ".webp": "image/webp"
-        }
-        media_type = media_types.get(ext, "image/png")
-        return f"data:{media_type};base64,{data}"
+        """Encode image to data URL (memoized per file version)."""
+        st = os.stat(path)
+        return _encode_image_url_cached(path, st.st_mtime, st.st_size, self.max_image_side)
+    
+    def _build_body(self, messages: List[dict]) -> bytes:
+        """
+        Build the JSON chat completion request body.
+        
+        Splices the pre-serialized tool block in, so only the model name
+        and messages are encoded per call.
+        """
+        if self.supports_prompt_cache:
+            messages = self._with_cache_markers(messages)
+        return (
+            b'{"model":' + orjson.dumps(self.model_name)
+            + b',"tools":' + _tools_json_fragment()
+            + b',"tool_choice":"auto","max_tokens":4096,"messages":'
+            + orjson.dumps(messages)
+            + b'}'
+        )
+    
+    @staticmethod
+    def _with_cache_markers(messages: List[dict]) -> List[dict]:
+        """
+        Return messages with cache_control on the stable prefix.
+        
+        Marks the system prompt and the last user turn before the current
+        one. The stored history is left untouched.
+        """
+        user_indices = [i for i, m in enumerate(messages) if m["role"] == "user"]
+        marked = {user_indices[-2]} if len(user_indices) >= 2 else set()
+        if messages and messages[0]["role"] == "system":
+            marked.add(0)
+        if not marked:
+            return messages
+        
+        result = list(messages)
+        for i in marked:
+            content = messages[i].get("content") or ""
+            if isinstance(content, str):
+                parts = [{"type": "text", "text": content}]
+            else:
+                parts = list(content)
+            if not parts:
+                continue
+            parts[-1] = {**parts[-1], "cache_control": CACHE_CONTROL}
+            result[i] = {**messages[i], "content": parts}
+        return result
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Return the pooled async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            if self._async_client is not None:
+                release_async_client(self._async_client, self._async_loop)
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={**self._auth_headers, "Accept-Encoding": ACCEPT_ENCODING},
+                http2=True,
+                timeout=120,
+                limits=httpx.Limits(max_keepalive_connections=32)
+            )
+            self._async_loop = loop
+        return self._async_client
+    
+    async def _call_api_async(self, messages: List[dict]) -> Optional[dict]:
+        """Async OpenAI-compatible chat completion request."""
+        try:
+            response = await self._get_async_client().post(
+                "/chat/completions",
+                headers={"Content-Type": "application/json"},
+                content=self._build_body(messages)
+            )
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
+            print(f"❌ API Error: {e}")
+            return None
     
     def _call_api(self) -> Optional[dict]:
         """Make OpenAI-compatible chat completion request."""
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model_name,
-                    "messages": self.messages,
-                    "tools": OPENAI_TOOLS,
-                    "tool_choice": "auto",
-                    "max_tokens": 4096
-                },
+            response = _SESSION.post(
+                self._chat_url,
+                headers=self._auth_headers,
+                data=self._build_body(self.messages),
                 timeout=120
             )
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"❌ API Error: {e}")
             return None
@@ -242,14 +623,54 @@ class CLIProxyBrain(Brain):
     def _handle_tool_calls(self, assistant_msg: dict, tool_calls: list) -> ThinkResult:
         """Execute tool calls and get final response."""
         self.messages.append(assistant_msg)
+        last_tool_name, last_tool_args, can_skip = self._run_tool_calls(self.messages, tool_calls)
+        
+        # Successful fire-and-forget actions: skip the follow-up round-trip
+        if can_skip:
+            return self._fire_and_forget_result(self.messages, last_tool_name, last_tool_args)
+        
+        # Get final response
+        final = self._call_api()
+        if final:
+            content = final.get("choices", [{}])[0].get("message", {}).get("content", "")
+            self.messages.append({"role": "assistant", "content": content})
+            return ThinkResult(
+                action="final_answer",
+                tool_name=last_tool_name,
+                tool_args=last_tool_args,
+                content=content
+            )
+        
+        return ThinkResult(action="final_answer", content="Tool executed")
+    
+    @staticmethod
+    def _fire_and_forget_result(messages: List[dict], tool_name: str, tool_args: dict) -> ThinkResult:
+        """Synthesize the assistant reply instead of asking the LLM for it."""
+        content = f"Đã thực hiện {tool_name}."
+        messages.append({"role": "assistant", "content": content})
+        return ThinkResult(
+            action="final_answer",
+            tool_name=tool_name,
+            tool_args=tool_args,
+            content=content
+        )
+    
+    def _run_tool_calls(self, messages: List[dict], tool_calls: list) -> tuple:
+        """
+        Execute tool calls, appending each result to messages.
         
+        Returns:
+            (last_tool_name, last_tool_args, can_skip) where can_skip is True
+            if every call was a fire-and-forget action that succeeded
+        """
         last_tool_name = ""
         last_tool_args = {}
+        can_skip = True
         
         for tc in tool_calls:
             func = tc.get("function", {})
             tool_name = func.get("name", "")
-            tool_args = json.loads(func.get("arguments", "{}"))
+            tool_args = orjson.loads(func.get("arguments", "{}"))
             tool_call_id = tc.get("id", "")
             
             last_tool_name = tool_name
@@ -264,6 +685,7 @@ class CLIProxyBrain(Brain):
             # Execute
             result = self._execute_tool(tool_name, tool_args)
             success = result.get("success", True)
+            can_skip = can_skip and success and tool_name in _FIRE_AND_FORGET
             
             print(f"   {'✅' if success else '❌'} {result.get('message', result.get('error', ''))}")
             
@@ -274,30 +696,21 @@ class CLIProxyBrain(Brain):
                 })
             
             # Add result to messages
-            self.messages.append({
+            messages.append({
                 "role": "tool",
                 "tool_call_id": tool_call_id,
-                "content": json.dumps(result, ensure_ascii=False)
+                "content": orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode()
             })
         
-        # Get final response
-        final = self._call_api()
-        if final:
-            content = final.get("choices", [{}])[0].get("message", {}).get("content", "")
-            self.messages.append({"role": "assistant", "content": content})
-            return ThinkResult(
-                action="final_answer",
-                tool_name=last_tool_name,
-                tool_args=last_tool_args,
-                content=content
-            )
-        
-        return ThinkResult(action="final_answer", content="Tool executed")
+        return last_tool_name, last_tool_args, can_skip
     
     def _execute_tool(self, name: str, args: dict) -> dict:
         """Execute a tool by name."""
-        if name in STRUCTURED_TOOLS:
-            return STRUCTURED_TOOLS[name](**args)
-        if name in TOOL_REGISTRY:
-            return TOOL_REGISTRY[name](**args)
-        return {"success": False, "error": f"Tool '{name}' not found"}
+        entry = resolve_tool(name)
+        if entry is None:
+            return {"success": False, "error": f"Tool '{name}' not found"}
+        try:
+            return entry.handler(**args)
+        finally:
+            if entry.name not in READ_ONLY_TOOLS:
+                invalidate_ui_cache()
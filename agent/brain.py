@@ -4,12 +4,20 @@ Brain - Abstract interface for Cloud AI providers.
 Provides a unified interface for Gemini, Claude, and OpenAI.
 Handles tool execution locally while delegating thinking to cloud.
 """
+import re
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 
 from agent.tool_schema import generate_tool_schemas
-from tools import TOOL_REGISTRY
+from core.ui_cache import invalidate_ui_cache
+from tools import READ_ONLY_TOOLS, TOOL_REGISTRY
+
+
+# Meta questions answered locally (no API call)
+META_KEYWORDS = ["tool nào", "làm được gì", "help", "có thể làm"]
+_META_RE = re.compile("|".join(map(re.escape, META_KEYWORDS)), re.IGNORECASE)
 
 
 @dataclass
@@ -72,6 +80,23 @@ class Brain(ABC):
         """
         pass
     
+    async def think_async(
+        self, 
+        user_request: str, 
+        screenshot_path: Optional[str] = None, 
+        ui_tree: Optional[str] = None,
+        persist: bool = True
+    ) -> ThinkResult:
+        """
+        Async variant of think().
+        
+        Default runs think() in a worker thread, which always records the
+        turn. Providers with a native async client should override this
+        and honor persist=False, which concurrent callers (chat_batch) use
+        to keep independent requests out of the conversation history.
+        """
+        return await asyncio.to_thread(self.think, user_request, screenshot_path, ui_tree)
+    
     @abstractmethod
     def reset(self) -> None:
         """Reset conversation history."""
@@ -114,6 +139,9 @@ class Brain(ABC):
             if self.verbose:
                 print(f"   ❌ {e}")
             return error
+        finally:
+            if tool_name not in READ_ONLY_TOOLS:
+                invalidate_ui_cache()
     
     def get_tool_names(self) -> List[str]:
         """Get list of available tool names."""
@@ -164,9 +192,7 @@ class CloudAgent:
             Final response to user
         """
         # Handle meta questions locally
-        input_lower = user_input.lower()
-        meta_keywords = ["tool nào", "làm được gì", "help", "có thể làm"]
-        if any(kw in input_lower for kw in meta_keywords):
+        if _META_RE.search(user_input):
             return self._get_capabilities()
         
         # Think-execute loop
@@ -202,6 +228,26 @@ class CloudAgent:
         
         return "⚠️ Đã thử quá nhiều lần. Dừng."
     
+    async def chat_batch(self, inputs: List[str]) -> List[str]:
+        """
+        Process independent requests concurrently (single think per input).
+        
+        Args:
+            inputs: List of user requests
+            
+        Returns:
+            List of responses, in the same order as inputs
+        """
+        results = await asyncio.gather(*[self.brain.think_async(x, persist=False) for x in inputs])
+        
+        responses = []
+        for result in results:
+            if result.action == "error":
+                responses.append(f"❌ Lỗi: {result.content}")
+            else:
+                responses.append(result.content)
+        return responses
+    
     def _format_tool_result(self, tool_name: str, result: dict) -> str:
         """Format tool result for AI context."""
         success = result.get("success", True)
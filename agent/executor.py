@@ -4,7 +4,11 @@ Tool Executor - Routes tool calls to implementations
 import json
 from typing import Any
 
-from tools import TOOL_REGISTRY
+from core.ui_cache import invalidate_ui_cache
+from tools import READ_ONLY_TOOLS, TOOL_REGISTRY
+
+# Bound once - dispatch does a single dict probe per call
+_get_tool = TOOL_REGISTRY.get
 
 
 def execute_tool(name: str, arguments: dict) -> dict:
@@ -18,7 +22,8 @@ def execute_tool(name: str, arguments: dict) -> dict:
     Returns:
         dict: Tool execution result
     """
-    if name not in TOOL_REGISTRY:
+    tool_func = _get_tool(name)
+    if tool_func is None:
         return {
             "success": False,
             "error": f"Unknown tool: {name}",
@@ -26,9 +31,7 @@ def execute_tool(name: str, arguments: dict) -> dict:
         }
     
     try:
-        tool_func = TOOL_REGISTRY[name]
-        result = tool_func(**arguments)
-        return result
+        return tool_func(**arguments)
         
     except TypeError as e:
         return {
@@ -40,6 +43,9 @@ def execute_tool(name: str, arguments: dict) -> dict:
             "success": False,
             "error": f"Tool execution failed: {e}"
         }
+    finally:
+        if name not in READ_ONLY_TOOLS:
+            invalidate_ui_cache()
 
 
 def format_tool_result(result: dict) -> str:
@@ -4,16 +4,83 @@ Cache Manager - SQLite-based caching layer for AI responses.
 Handles storage, retrieval, and invalidation of cached AI thoughts.
 """
 import sqlite3
-import json
-import hashlib
+import orjson
+import threading
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
-from dataclasses import asdict
+from dataclasses import asdict, dataclass, field
 
 from agent.brain import ThinkResult
+from agent.middleware.key_generator import fast_hash
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Semantic layer is optional
+    np = None
+    SentenceTransformer = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # Falls back to NumPy matmul
+    njit = None
+
+try:
+    import zstandard as zstd
+    _CCTX = zstd.ZstdCompressor(level=3)
+    _DCTX = zstd.ZstdDecompressor()
+except ImportError:  # Values are stored uncompressed
+    zstd = None
 
 DB_PATH = Path("cache.db")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Bump when the key derivation changes so old rows stop matching
+KEY_VERSION = "v2"
+
+# cache_entries.flags bits
+FLAG_ZSTD = 1
+COMPRESS_MIN_BYTES = 512  # Smaller values don't shrink enough to pay off
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dot_rows(matrix, query, out):
+        """out[i] = matrix[i] . query, rows split across threads."""
+        n, dim = matrix.shape
+        for i in prange(n):
+            acc = 0.0
+            for j in range(dim):
+                acc += matrix[i, j] * query[j]
+            out[i] = acc
+
+
+@dataclass(slots=True)
+class _ScopeVectors:
+    """Resident embeddings of one scope; rows past len(keys) are spare capacity."""
+    keys: List[str]
+    buffer: Any  # float32 (capacity, dim), None while empty
+    key_set: set = field(default_factory=set)
+    
+    @property
+    def matrix(self):
+        return None if self.buffer is None else self.buffer[:len(self.keys)]
+
+
+def best_match(matrix, query) -> Tuple[int, float]:
+    """
+    Return (row index, score) of the row with the highest dot product.
+    
+    Rows and query are pre-normalized, so the score is cosine similarity.
+    """
+    if njit is not None:
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        _dot_rows(matrix, query, scores)
+    else:
+        scores = matrix @ query
+    best = int(np.argmax(scores))
+    return best, float(scores[best])
 
 class CacheManager:
     """
@@ -21,31 +88,160 @@ class CacheManager:
     
     Schema:
         key: TEXT PRIMARY KEY (Hash of context)
-        value: TEXT (JSON serialized ThinkResult)
+        value: BLOB (JSON serialized ThinkResult, zstd-compressed if flagged)
+        flags: INTEGER (bit 1 = FLAG_ZSTD)
         created_at: REAL (Timestamp)
         expires_at: REAL (Timestamp)
         metadata: TEXT (JSON metadata for invalidation, e.g. user_id, scope)
+    
+    Semantic layer (optional, needs sentence-transformers + numpy):
+        cache_vectors(key, scope, embedding) stores a normalized float16
+        embedding per entry. get_similar() matches paraphrased requests by
+        cosine similarity against the per-scope matrix kept in memory,
+        using a parallel Numba kernel when numba is installed.
+    
+    A single WAL-mode connection is kept open for the lifetime of the
+    manager and shared across threads under an RLock.
+    """
+    
+    PRAGMAS = (
+        # Must precede journal_mode, which initializes a new file
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-16000",  # 16 MB page cache
+    )
+    
+    SQL_GET = "SELECT value, expires_at, flags FROM cache_entries WHERE key = ?"
+    SQL_GET_MANY = "SELECT key, value, expires_at, flags FROM cache_entries WHERE key IN ({})"
+    SQL_SET = """
+        INSERT OR REPLACE INTO cache_entries
+            (key, value, created_at, expires_at, metadata, flags, last_accessed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    SQL_TOUCH = "UPDATE cache_entries SET last_accessed_at = ? WHERE key = ?"
+    SQL_DELETE = "DELETE FROM cache_entries WHERE key = ?"
+    SQL_DELETE_EXPIRED = """
+        DELETE FROM cache_entries WHERE key IN (
+            SELECT key FROM cache_entries WHERE expires_at < ? LIMIT ?
+        )
     """
+    SQL_DELETE_LRU = """
+        DELETE FROM cache_entries WHERE rowid IN (
+            SELECT rowid FROM cache_entries ORDER BY last_accessed_at ASC LIMIT ?
+        )
+    """
+    
+    DELETE_BATCH_SIZE = 1000  # Keep write transactions short under WAL
+    ACCESS_FLUSH_EVERY = 64  # Buffered hits per last_accessed_at write
+    VECTOR_GROW_ROWS = 256  # Minimum capacity of a scope's embedding matrix
     
-    def __init__(self, db_path: Path = DB_PATH, default_ttl: int = 3600 * 24):
+    def __init__(
+        self, 
+        db_path: Path = DB_PATH, 
+        default_ttl: int = 3600 * 24,
+        semantic: bool = False,
+        similarity_threshold: float = 0.92,
+        max_entries: int = 10000,
+        maintenance: bool = True
+    ):
         self.db_path = db_path
         self.default_ttl = default_ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        
+        self._lock = threading.RLock()
+        self._accessed: Dict[str, float] = {}  # key -> last hit, not yet written
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        for pragma in self.PRAGMAS:
+            self._conn.execute(pragma)
         self._init_db()
         
+        # scope -> resident normalized float32 embeddings, loaded lazily
+        self._vectors: Dict[str, _ScopeVectors] = {}
+        self._embedder = None
+        if semantic:
+            if SentenceTransformer is None:
+                print("⚠️ Semantic cache disabled: sentence-transformers/numpy not installed")
+            else:
+                self._embedder = SentenceTransformer(EMBEDDING_MODEL)
+                self._warmup()
+        
+        # Periodic cleanup/prune off the request path
+        self._stop_event = threading.Event()
+        if maintenance:
+            threading.Thread(
+                target=self._maintenance_loop, 
+                name="cache-maintenance", 
+                daemon=True
+            ).start()
+    
+    @property
+    def semantic_enabled(self) -> bool:
+        return self._embedder is not None
+    
+    def _maintenance_loop(self):
+        """Background thread: expire entries and prune near the size limit."""
+        interval = max(min(self.default_ttl // 10, 300), 1)
+        # First pass right away, so short sessions still prune
+        while True:
+            try:
+                self.flush_access_times()
+                self.cleanup()
+                if self.count() > 0.9 * self.max_entries:
+                    self.prune_to_limit(self.max_entries)
+                    with self._lock:
+                        # Return freed pages to the OS (no-op without auto_vacuum)
+                        self._conn.execute("PRAGMA incremental_vacuum")
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break  # close() shut the connection mid-pass
+                # Keep the thread alive; the next pass retries
+                print(f"⚠️ Cache maintenance error: {e}")
+            if self._stop_event.wait(interval):
+                break
+    
+    def _warmup(self):
+        """Trigger JIT compilation so the first user query is not hit by it."""
+        dim = self._embedder.get_sentence_embedding_dimension()
+        best_match(np.zeros((1, dim), dtype=np.float32), np.zeros(dim, dtype=np.float32))
+        
     def _init_db(self):
         """Initialize SQLite database."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock:
+            conn = self._conn
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS cache_entries (
                     key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
+                    value BLOB NOT NULL,
                     created_at REAL NOT NULL,
                     expires_at REAL NOT NULL,
-                    metadata TEXT
+                    metadata TEXT,
+                    flags INTEGER NOT NULL DEFAULT 0,
+                    last_accessed_at REAL NOT NULL DEFAULT 0
                 )
             """)
-            # Index for cleanup
+            # Migrate databases created before the flags/last_accessed_at columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_entries)")}
+            if "flags" not in columns:
+                conn.execute("ALTER TABLE cache_entries ADD COLUMN flags INTEGER NOT NULL DEFAULT 0")
+            if "last_accessed_at" not in columns:
+                conn.execute("ALTER TABLE cache_entries ADD COLUMN last_accessed_at REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE cache_entries SET last_accessed_at = created_at")
+            # Indexes for cleanup and LRU pruning
             conn.execute("CREATE INDEX IF NOT EXISTS idx_expires_at ON cache_entries(expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_accessed_at ON cache_entries(last_accessed_at)")
+            # Embeddings for the semantic layer
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_vectors (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    embedding BLOB NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_scope ON cache_vectors(scope)")
             
     def generate_key(self, system_prompt: str, user_request: str, user_id: str = "default", scope: str = "shared") -> str:
         """
@@ -61,7 +257,7 @@ class CacheManager:
             Hash string.
         """
         # 1. Static Part (System Prompt)
-        static_hash = hashlib.md5(system_prompt.encode()).hexdigest()
+        static_hash = fast_hash(system_prompt)
         
         # 2. Dynamic Part
         if scope == "personal":
@@ -71,57 +267,215 @@ class CacheManager:
             # Shared knowledge
             content = f"{user_request}"
             
-        dynamic_hash = hashlib.md5(content.encode()).hexdigest()
+        dynamic_hash = fast_hash(content)
         
-        return f"{scope}:{static_hash}:{dynamic_hash}"
+        return f"{KEY_VERSION}:{scope}:{static_hash}:{dynamic_hash}"
 
     def get(self, key: str) -> Optional[ThinkResult]:
         """Retrieve from cache if exists and not expired."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT value, expires_at FROM cache_entries WHERE key = ?", 
-                (key,)
-            )
-            row = cursor.fetchone()
+        with self._lock:
+            row = self._conn.execute(self.SQL_GET, (key,)).fetchone()
             
             if not row:
                 return None
                 
-            value_json, expires_at = row
+            value, expires_at, flags = row
             
             # Check expiration
-            if time.time() > expires_at:
+            now = time.time()
+            if now > expires_at:
                 # Lazy delete
-                conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._conn.execute(self.SQL_DELETE, (key,))
                 return None
+            
+            self._touch(key, now)
                 
-            try:
-                data = json.loads(value_json)
-                return ThinkResult(**data)
-            except Exception as e:
-                print(f"⚠️ Cache deserialization error: {e}")
-                return None
+        return self._decode(value, flags)
+    
+    def get_many(self, keys: List[str]) -> Dict[str, ThinkResult]:
+        """
+        Retrieve several keys in one query.
+        
+        Returns:
+            {key: result} for the keys that exist and are not expired.
+        """
+        if not keys:
+            return {}
+        
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                self.SQL_GET_MANY.format(",".join("?" * len(keys))), keys
+            ).fetchall()
+            
+            expired = [(key,) for key, _, expires_at, _ in rows if now > expires_at]
+            if expired:
+                # Lazy delete
+                self._conn.executemany(self.SQL_DELETE, expired)
+            
+            for key, _, expires_at, _ in rows:
+                if now <= expires_at:
+                    self._touch(key, now)
+        
+        hits = {}
+        for key, value, expires_at, flags in rows:
+            if now > expires_at:
+                continue
+            result = self._decode(value, flags)
+            if result:
+                hits[key] = result
+        return hits
+    
+    def _touch(self, key: str, now: float) -> None:
+        """Buffer a hit; access times are written in batches (caller holds the lock)."""
+        self._accessed[key] = now
+        if len(self._accessed) >= self.ACCESS_FLUSH_EVERY:
+            self.flush_access_times()
+    
+    def flush_access_times(self) -> None:
+        """Write buffered last_accessed_at updates."""
+        with self._lock:
+            if not self._accessed:
+                return
+            updates = [(at, key) for key, at in self._accessed.items()]
+            self._accessed.clear()
+            self._conn.executemany(self.SQL_TOUCH, updates)
+    
+    @staticmethod
+    def _decode(value: bytes, flags: int) -> Optional[ThinkResult]:
+        """Deserialize a stored value, decompressing if flagged."""
+        try:
+            if flags & FLAG_ZSTD:
+                if zstd is None:
+                    return None
+                value = _DCTX.decompress(value)
+            data = orjson.loads(value)
+            return ThinkResult(**data)
+        except Exception as e:
+            print(f"⚠️ Cache deserialization error: {e}")
+            return None
 
-    def set(self, key: str, result: ThinkResult, ttl: Optional[int] = None, metadata: Dict = None):
-        """Store result in cache."""
+    def get_similar(self, query: str, scope: str) -> Optional[ThinkResult]:
+        """
+        Retrieve the entry whose query is semantically closest to `query`.
+        
+        Returns None if the semantic layer is disabled, the scope is empty,
+        or the best cosine similarity is below similarity_threshold.
+        """
+        if not self.semantic_enabled:
+            return None
+        
+        keys, matrix = self._load_vectors(scope)
+        if not keys:
+            return None
+        
+        best, score = best_match(matrix, self._embed(query))
+        if score < self.similarity_threshold:
+            return None
+        
+        return self.get(keys[best])
+    
+    def set(
+        self, 
+        key: str, 
+        result: ThinkResult, 
+        ttl: Optional[int] = None, 
+        metadata: Dict = None,
+        query: Optional[str] = None,
+        scope: Optional[str] = None
+    ):
+        """
+        Store result in cache.
+        
+        If query and scope are given and the semantic layer is enabled,
+        the query embedding is stored so get_similar() can match it.
+        """
         # Only cache final answers for now to avoid side-effects of tool calls
         if result.action != "final_answer":
             return
             
         ttl = ttl or self.default_ttl
-        expires_at = time.time() + ttl
-        
-        value_json = json.dumps(asdict(result))
-        metadata_json = json.dumps(metadata or {})
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO cache_entries (key, value, created_at, expires_at, metadata)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (key, value_json, time.time(), expires_at, metadata_json)
+        now = time.time()
+        expires_at = now + ttl
+        
+        value = orjson.dumps(asdict(result), option=orjson.OPT_NON_STR_KEYS)
+        metadata_json = orjson.dumps(metadata or {}).decode()
+        
+        flags = 0
+        if zstd is not None and len(value) >= COMPRESS_MIN_BYTES:
+            value = _CCTX.compress(value)
+            flags |= FLAG_ZSTD
+        else:
+            value = value.decode()
+        
+        with self._lock:
+            self._conn.execute(
+                self.SQL_SET,
+                (key, value, now, expires_at, metadata_json, flags, now)
             )
+        
+        if query and scope and self.semantic_enabled:
+            self._add_vector(key, scope, self._embed(query))
+    
+    def _embed(self, text: str):
+        """Embed text as a normalized float32 vector."""
+        return self._embedder.encode(text, normalize_embeddings=True).astype(np.float32)
+    
+    def _load_vectors(self, scope: str) -> Tuple[List[str], Any]:
+        """
+        Snapshot (keys, matrix) of a scope, loading it on first use.
+        
+        The matrix is a view of the rows present now; later appends only
+        write past it, so it stays valid without holding the lock.
+        """
+        with self._lock:
+            vectors = self._vectors.get(scope)
+            if vectors is None:
+                rows = self._conn.execute(
+                    "SELECT key, embedding FROM cache_vectors WHERE scope = ?", 
+                    (scope,)
+                ).fetchall()
+                keys = [row[0] for row in rows]
+                if rows:
+                    buffer = np.vstack([np.frombuffer(row[1], dtype=np.float16) for row in rows])
+                    buffer = buffer.astype(np.float32)
+                else:
+                    buffer = None
+                vectors = self._vectors[scope] = _ScopeVectors(keys, buffer, set(keys))
+            return vectors.keys, vectors.matrix
+    
+    def _add_vector(self, key: str, scope: str, embedding) -> None:
+        """Persist an embedding and append it to the resident matrix, if loaded."""
+        row = embedding.astype(np.float16)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_vectors (key, scope, embedding) VALUES (?, ?, ?)",
+                (key, scope, row.tobytes())
+            )
+            
+            vectors = self._vectors.get(scope)
+            if vectors is None:
+                return  # Read from the table, this row included, on first lookup
+            if key in vectors.key_set:
+                # Replaced entry - reload on next lookup
+                self._vectors.pop(scope, None)
+                return
+            
+            n = len(vectors.keys)
+            if vectors.buffer is None or n == vectors.buffer.shape[0]:
+                # Double the capacity so appends are amortized O(1)
+                grown = np.empty((max(2 * n, self.VECTOR_GROW_ROWS), row.shape[0]), dtype=np.float32)
+                if n:
+                    grown[:n] = vectors.buffer[:n]
+                vectors.buffer = grown
+            vectors.buffer[n] = row
+            vectors.keys.append(key)
+            vectors.key_set.add(key)
+    
+    def _drop_orphan_vectors(self) -> None:
+        """Remove embeddings whose cache entry no longer exists."""
+        self._conn.execute("DELETE FROM cache_vectors WHERE key NOT IN (SELECT key FROM cache_entries)")
+        self._vectors.clear()
 
     def invalidate(self, user_id: str):
         """Invalidate all personal cache for a user."""
@@ -145,42 +499,62 @@ class CacheManager:
         pass 
         
     def cleanup(self):
-        """Remove expired entries."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+        """Remove expired entries (in batches)."""
+        now = time.time()
+        while True:
+            with self._lock:
+                deleted = self._conn.execute(
+                    self.SQL_DELETE_EXPIRED, (now, self.DELETE_BATCH_SIZE)
+                ).rowcount
+            if deleted < self.DELETE_BATCH_SIZE:
+                break
+        with self._lock:
+            self._drop_orphan_vectors()
+    
+    def count(self) -> int:
+        """Number of cache entries."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
     
     def prune_to_limit(self, max_entries: int = 10000):
         """
-        Remove oldest entries if table exceeds max_entries.
+        Remove least recently used entries if table exceeds max_entries.
         Prevents SQLite bloat.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            # Count entries
-            cursor = conn.execute("SELECT COUNT(*) FROM cache_entries")
-            count = cursor.fetchone()[0]
-            
-            if count > max_entries:
-                # Delete oldest entries (by created_at)
-                delete_count = count - max_entries
-                conn.execute("""
-                    DELETE FROM cache_entries 
-                    WHERE key IN (
-                        SELECT key FROM cache_entries 
-                        ORDER BY created_at ASC 
-                        LIMIT ?
-                    )
-                """, (delete_count,))
-                print(f"🗑️ Pruned {delete_count} old cache entries")
+        remaining = self.count() - max_entries
+        if remaining <= 0:
+            return
+        
+        # Recent hits must be on disk before choosing victims
+        self.flush_access_times()
+        
+        # Delete least recently used entries (indexed), in batches
+        delete_count = remaining
+        while remaining > 0:
+            batch = min(remaining, self.DELETE_BATCH_SIZE)
+            with self._lock:
+                self._conn.execute(self.SQL_DELETE_LRU, (batch,))
+            remaining -= batch
+        with self._lock:
+            self._drop_orphan_vectors()
+        print(f"🗑️ Pruned {delete_count} least recently used cache entries")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT COUNT(*), SUM(LENGTH(value)) FROM cache_entries")
+        with self._lock:
+            cursor = self._conn.execute("SELECT COUNT(*), SUM(LENGTH(value)) FROM cache_entries")
             count, total_bytes = cursor.fetchone()
             return {
                 "entries": count or 0,
                 "size_bytes": total_bytes or 0,
                 "size_mb": (total_bytes or 0) / (1024 * 1024)
             }
+    
+    def close(self):
+        """Stop background maintenance and close the database connection."""
+        self._stop_event.set()
+        self.flush_access_times()
+        with self._lock:
+            self._conn.close()
 
 
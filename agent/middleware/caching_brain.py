@@ -4,15 +4,19 @@ Caching Brain V3 - Hybrid Key Strategy with SQLite Pruning.
 Changes from V2:
 1. Dual-key read: Try ContextKey first, fallback to ContentKey
 2. Dual-key write: Write to appropriate key(s) based on scope
-3. SQLite pruning on initialization
+3. SQLite pruning by CacheManager's maintenance thread
 """
+import time
 import uuid
-from typing import Optional, Dict, Any, List
-import hashlib
+from collections import deque, OrderedDict
+from typing import Optional, Dict, Any, List, Deque, Tuple
 
 from agent.brain import Brain, ThinkResult
 from agent.middleware.cache_manager import CacheManager
-from agent.middleware.key_generator import SmartKeyGenerator, KeyResult
+from agent.middleware.key_generator import (
+    SmartKeyGenerator, KeyResult, HistoryMsg, ROLE_USER, ROLE_ASSISTANT,
+    SHARED_CONTEXT_CONFIDENCE, fast_hash
+)
 
 
 class CachingBrain(Brain):
@@ -29,7 +33,8 @@ class CachingBrain(Brain):
     - High confidence shared (>=0.7): Write to both
     """
     
-    MAX_CACHE_ENTRIES = 10000  # Prune beyond this
+    L1_MAX_ENTRIES = 256  # In-memory LRU in front of SQLite
+    L1_TTL = 300  # Seconds; bounds staleness vs. the SQLite copy
     
     def __init__(self, wrapped_brain: Brain, cache_manager: CacheManager, user_id: str = "default"):
         self.wrapped_brain = wrapped_brain
@@ -39,27 +44,23 @@ class CachingBrain(Brain):
         
         # Conversation tracking
         self.conversation_id = str(uuid.uuid4())[:8]
-        self.conversation_history: List[Dict] = []
+        # Only the last history_window messages feed the fingerprint
+        self.conversation_history: Deque[HistoryMsg] = deque(maxlen=2 * self.key_generator.history_window)
+        
+        # Rolling history fingerprint, updated per recorded message
+        self._message_fps: Deque[Tuple[str, str]] = deque(maxlen=self.key_generator.history_window)
+        self._history_fp = "empty"
+        
+        # L1: key -> (result, expires_at), most recently used last
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
         
         # System prompt hash for cache invalidation when prompt changes
-        system_prompt = getattr(wrapped_brain, "system_prompt", "")
-        self.system_prompt_hash = hashlib.md5(system_prompt.encode()).hexdigest()
+        self._set_system_prompt_hash(getattr(wrapped_brain, "system_prompt", ""))
         
         # Copy attributes from wrapped brain
         self.model_name = wrapped_brain.model_name
         self.api_key = wrapped_brain.api_key
         
-        # Prune on startup
-        self._prune_cache()
-        
-    def _prune_cache(self):
-        """Prune old entries to prevent SQLite bloat."""
-        try:
-            self.cache_manager.cleanup()  # Remove expired entries
-            self.cache_manager.prune_to_limit(self.MAX_CACHE_ENTRIES)
-        except Exception as e:
-            print(f"⚠️ Cache pruning error: {e}")
-        
     def think(
         self, 
         user_request: str, 
@@ -70,61 +71,150 @@ class CachingBrain(Brain):
         Hybrid Key Strategy: Try ContextKey first, then ContentKey.
         """
         # 1. Generate keys
-        key_result = self.key_generator.generate_keys(
-            user_id=self.user_id,
-            conversation_id=self.conversation_id,
-            user_query=user_request,
-            conversation_history=self.conversation_history,
-            system_prompt_hash=self.system_prompt_hash
-        )
+        key_result = self._generate_keys(user_request)
         
         # 2. Handle blacklist
         if key_result.scope == "blacklisted":
             print(f"⛔ Cache SKIP (blacklisted): {user_request[:30]}...")
             return self._call_and_record(user_request, screenshot_path, ui_tree)
         
-        # 3. Try ContextKey first (precise match)
-        if key_result.context_key:
-            cached = self.cache_manager.get(key_result.context_key)
-            if cached:
-                print(f"⚡ Cache HIT (context): {key_result.context_key[-8:]}...")
-                return cached
-        
-        # 4. Fallback to ContentKey (shared cache)
-        if key_result.content_key and key_result.scope == "shared":
-            cached = self.cache_manager.get(key_result.content_key)
-            if cached:
-                print(f"⚡ Cache HIT (content): {key_result.content_key[-8:]}...")
-                return cached
+        # 3-4. Try ContextKey, then ContentKey, then semantic match
+        cached = self._lookup(key_result, user_request)
+        if cached:
+            return cached
         
         # 5. Cache miss - call real brain
         print(f"🐢 Cache MISS ({key_result.scope}, conf={key_result.confidence:.1f})")
         result = self._call_and_record(user_request, screenshot_path, ui_tree)
         
         # 6. Store in cache based on scope
-        if result.action == "final_answer":
-            metadata = {
-                "user_id": self.user_id,
-                "scope": key_result.scope,
-                "query": user_request[:50]
-            }
+        self._store(key_result, user_request, result)
+        return result
+    
+    async def think_async(
+        self, 
+        user_request: str, 
+        screenshot_path: Optional[str] = None, 
+        ui_tree: Optional[str] = None,
+        persist: bool = True
+    ) -> ThinkResult:
+        """Async variant of think() delegating misses to wrapped_brain.think_async."""
+        key_result = self._generate_keys(user_request)
+        
+        if key_result.scope != "blacklisted":
+            cached = self._lookup(key_result, user_request)
+            if cached:
+                return cached
+            print(f"🐢 Cache MISS ({key_result.scope}, conf={key_result.confidence:.1f})")
+        
+        result = await self.wrapped_brain.think_async(user_request, screenshot_path, ui_tree, persist)
+        self._record(user_request, result)
+        
+        if key_result.scope != "blacklisted":
+            self._store(key_result, user_request, result)
+        return result
+    
+    def _generate_keys(self, user_request: str) -> KeyResult:
+        """Generate cache keys for the current conversation state."""
+        return self.key_generator.generate_keys(
+            user_id=self.user_id,
+            conversation_id=self.conversation_id,
+            user_query=user_request,
+            conversation_history=self.conversation_history,
+            system_prompt_hash_short=self.system_prompt_hash_short,
+            history_fp=self._history_fp
+        )
+    
+    def _lookup(self, key_result: KeyResult, user_request: str) -> Optional[ThinkResult]:
+        """
+        Try ContextKey first (precise match), then ContentKey (shared cache),
+        then a semantic match against shared entries (paraphrases).
+        """
+        shared = key_result.scope == "shared"
+        keys = [k for k in (key_result.context_key, shared and key_result.content_key) if k]
+        
+        # L1 first, then the remaining exact keys in one SQLite round-trip
+        hits = {k: r for k in keys if (r := self._l1_get(k))}
+        missing = [k for k in keys if k not in hits]
+        if missing and key_result.context_key not in hits:
+            for k, r in self.cache_manager.get_many(missing).items():
+                hits[k] = r
+                self._l1_put(k, r)
+        
+        cached = hits.get(key_result.context_key)
+        if cached:
+            print(f"⚡ Cache HIT (context): {key_result.context_key[-8:]}...")
+            return cached
+        
+        if key_result.content_key and shared:
+            cached = hits.get(key_result.content_key)
+            if cached:
+                print(f"⚡ Cache HIT (content): {key_result.content_key[-8:]}...")
+                return cached
             
-            if key_result.scope == "shared":
-                # Write to ContentKey (shared cache)
-                if key_result.content_key:
-                    self.cache_manager.set(key_result.content_key, result, metadata=metadata)
-                    
-                # If high confidence, also write to ContextKey for precision
-                if key_result.confidence >= 0.7 and key_result.context_key:
-                    self.cache_manager.set(key_result.context_key, result, metadata=metadata)
-                    
-            elif key_result.scope == "contextual":
-                # Write to ContextKey only
-                if key_result.context_key:
-                    self.cache_manager.set(key_result.context_key, result, metadata=metadata)
+            cached = self.cache_manager.get_similar(user_request, scope=self._semantic_scope)
+            if cached:
+                print(f"⚡ Cache HIT (semantic): {user_request[:30]}...")
+                return cached
         
+        return None
+    
+    def _l1_get(self, key: str) -> Optional[ThinkResult]:
+        entry = self._l1.get(key)
+        if entry is None:
+            return None
+        result, expires_at = entry
+        if time.time() > expires_at:
+            del self._l1[key]
+            return None
+        self._l1.move_to_end(key)
         return result
     
+    def _l1_put(self, key: str, result: ThinkResult) -> None:
+        ttl = min(self.L1_TTL, self.cache_manager.default_ttl)
+        self._l1[key] = (result, time.time() + ttl)
+        self._l1.move_to_end(key)
+        if len(self._l1) > self.L1_MAX_ENTRIES:
+            self._l1.popitem(last=False)
+    
+    def _set_system_prompt_hash(self, prompt: str) -> None:
+        """Hash the prompt and precompute the per-request derived values."""
+        self.system_prompt_hash = fast_hash(prompt)
+        self.system_prompt_hash_short = self.system_prompt_hash[:8]
+        # Semantic matches are only valid under the same system prompt
+        self._semantic_scope = f"shared:{self.system_prompt_hash_short}"
+    
+    def _store(self, key_result: KeyResult, user_request: str, result: ThinkResult) -> None:
+        """Write a final answer to the key(s) matching its scope."""
+        if result.action != "final_answer":
+            return
+        
+        metadata = {
+            "user_id": self.user_id,
+            "scope": key_result.scope,
+            "query": user_request[:50]
+        }
+        
+        if key_result.scope == "shared":
+            # Write to ContentKey (shared cache)
+            if key_result.content_key:
+                self.cache_manager.set(
+                    key_result.content_key, result, metadata=metadata,
+                    query=user_request, scope=self._semantic_scope
+                )
+                self._l1_put(key_result.content_key, result)
+                
+            # If high confidence, also write to ContextKey for precision
+            if key_result.confidence >= SHARED_CONTEXT_CONFIDENCE and key_result.context_key:
+                self.cache_manager.set(key_result.context_key, result, metadata=metadata)
+                self._l1_put(key_result.context_key, result)
+                
+        elif key_result.scope == "contextual":
+            # Write to ContextKey only
+            if key_result.context_key:
+                self.cache_manager.set(key_result.context_key, result, metadata=metadata)
+                self._l1_put(key_result.context_key, result)
+    
     def _call_and_record(
         self, 
         user_request: str, 
@@ -133,30 +223,35 @@ class CachingBrain(Brain):
     ) -> ThinkResult:
         """Call wrapped brain and record conversation."""
         result = self.wrapped_brain.think(user_request, screenshot_path, ui_tree)
-        
-        # Record conversation for future context
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_request
-        })
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": result.content[:200] if result.content else ""
-        })
-        
+        self._record(user_request, result)
         return result
+    
+    def _record(self, user_request: str, result: ThinkResult) -> None:
+        """Record conversation turn for future context."""
+        for msg in (
+            HistoryMsg(ROLE_USER, user_request),
+            HistoryMsg(ROLE_ASSISTANT, result.content[:200] if result.content else ""),
+        ):
+            self.conversation_history.append(msg)
+            self._message_fps.append(self.key_generator.message_fingerprint(*msg))
+        
+        self._history_fp = self.key_generator.combine_fingerprints(self._message_fps)
 
     # --- Delegation Methods ---
     
     def reset(self) -> None:
         """Reset clears conversation context."""
         self.conversation_id = str(uuid.uuid4())[:8]
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self._message_fps.clear()
+        self._history_fp = "empty"
+        self._l1.clear()
         return self.wrapped_brain.reset()
         
     def update_system_prompt(self, prompt: str) -> None:
         # Update hash when prompt changes (invalidates content cache naturally)
-        self.system_prompt_hash = hashlib.md5(prompt.encode()).hexdigest()
+        self._set_system_prompt_hash(prompt)
+        self._l1.clear()
         return self.wrapped_brain.update_system_prompt(prompt)
         
     def execute_tool(self, tool_name: str, tool_args: dict) -> Dict[str, Any]:
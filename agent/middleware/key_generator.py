@@ -8,9 +8,52 @@ Changes from V2:
 """
 import hashlib
 import re
-from typing import List, Dict, Optional, Tuple
+import sys
+import threading
+from collections import namedtuple
+from itertools import islice
+from typing import List, Dict, Optional, Sequence, Tuple, Union
 from dataclasses import dataclass
 
+try:
+    import xxhash
+except ImportError:  # Falls back to hashlib.blake2b
+    xxhash = None
+
+try:
+    import hyperscan
+except ImportError:  # Falls back to Aho-Corasick / regex
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:  # Falls back to a single compiled regex
+    ahocorasick = None
+
+
+def fast_hash(text: Union[str, bytes]) -> str:
+    """64-bit non-cryptographic hex digest for cache keys."""
+    if isinstance(text, str):
+        text = text.encode()
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(text)
+    return hashlib.blake2b(text, digest_size=8).hexdigest()
+
+
+def fast_hash_parts(*parts: Union[str, bytes]) -> str:
+    """
+    fast_hash("|".join(parts)) without building the joined string.
+    
+    Parts are fed to a streaming hasher, so callers can encode a value
+    once and reuse the bytes across several keys.
+    """
+    hasher = xxhash.xxh3_64() if xxhash is not None else hashlib.blake2b(digest_size=8)
+    for i, part in enumerate(parts):
+        if i:
+            hasher.update(b"|")
+        hasher.update(part.encode() if isinstance(part, str) else part)
+    return hasher.hexdigest()
+
 
 # Blacklist: Force cache miss for time-sensitive queries
 BLACKLIST_KEYWORDS = [
@@ -42,8 +85,123 @@ FACTUAL_INDICATORS = [
     "giải thích", "hướng dẫn", "cách", "làm sao", "tại sao",
 ]
 
+_WORD_RE = re.compile(r"\w+")
+_TRAILING_PUNCT_RE = re.compile(r'[.?!,;:]+$')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Single-word factual indicators are matched as whole tokens via set
+# intersection; multi-word or punctuated ones ("how to", "c++") stay
+# substrings. Personal indicators are always substrings so plurals and
+# longer forms ("favorites", "accounts", "myself") keep the query private.
+FACTUAL_TOKENS = frozenset(x for x in FACTUAL_INDICATORS if _WORD_RE.fullmatch(x))
+FACTUAL_PHRASES = tuple(x for x in FACTUAL_INDICATORS if x not in FACTUAL_TOKENS)
+
+# Substring keyword -> categories it belongs to. Blacklist keywords stay
+# substrings so plurals like "stocks" or "prices" still force a miss.
+_KEYWORD_CATEGORIES: Dict[str, Tuple[str, ...]] = {}
+for _category, _keywords in (
+    ("blacklist", BLACKLIST_KEYWORDS),
+    ("personal", PERSONAL_INDICATORS),
+    ("factual", FACTUAL_PHRASES),
+):
+    for _kw in _keywords:
+        _KEYWORD_CATEGORIES[_kw] = _KEYWORD_CATEGORIES.get(_kw, ()) + (_category,)
+
+if hyperscan is not None:
+    # SIMD literal matcher; SINGLEMATCH reports each keyword once per scan
+    _KEYWORD_LIST = list(_KEYWORD_CATEGORIES)
+    _HS_DB = hyperscan.Database()
+    _HS_DB.compile(
+        expressions=[re.escape(kw).encode() for kw in _KEYWORD_LIST],
+        ids=list(range(len(_KEYWORD_LIST))),
+        elements=len(_KEYWORD_LIST),
+        flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_KEYWORD_LIST),
+    )
+    _HS_LOCK = threading.Lock()  # One scratch space per database
+elif ahocorasick is not None:
+    _AUTOMATON = ahocorasick.Automaton()
+    for _kw in _KEYWORD_CATEGORIES:
+        _AUTOMATON.add_word(_kw, _kw)
+    _AUTOMATON.make_automaton()
+else:
+    # Zero-width lookahead so overlapping keywords are all visited; the
+    # longest-first alternation picks the longest hit at each position and
+    # _KEYWORD_PREFIXES adds the shorter ones it hides (e.g. "java").
+    _KEYWORD_RE = re.compile(
+        "(?=(" + "|".join(map(re.escape, sorted(_KEYWORD_CATEGORIES, key=len, reverse=True))) + "))"
+    )
+    _KEYWORD_PREFIXES = {
+        kw: tuple(other for other in _KEYWORD_CATEGORIES if other != kw and kw.startswith(other))
+        for kw in _KEYWORD_CATEGORIES
+    }
+
+
+def _iter_keywords(query_lower: str):
+    """Yield every substring keyword in the query (repeats possible)."""
+    if hyperscan is not None:
+        ids = []
+        with _HS_LOCK:
+            _HS_DB.scan(
+                query_lower.encode(),
+                match_event_handler=lambda kw_id, start, end, flags, ctx: ids.append(kw_id)
+            )
+        for kw_id in ids:
+            yield _KEYWORD_LIST[kw_id]
+    elif ahocorasick is not None:
+        for _, kw in _AUTOMATON.iter(query_lower):
+            yield kw
+    else:
+        for match in _KEYWORD_RE.finditer(query_lower):
+            kw = match.group(1)
+            yield kw
+            yield from _KEYWORD_PREFIXES[kw]
+
+
+def _scan_keywords(query_lower: str) -> Dict[str, int]:
+    """
+    Scan a lowercased query once for every keyword list.
+    
+    Substring keywords are found in a single matcher pass; single-word
+    factual indicators by intersecting the query's tokens with FACTUAL_TOKENS.
+    Work stops as soon as the scope is decided: the first blacklist hit
+    returns immediately, and factual indicators are not counted (left at
+    0) once a personal one is found.
+    
+    Returns:
+        Number of distinct keywords found per category
+        ("blacklist", "personal", "factual").
+    """
+    hits = set()
+    for kw in _iter_keywords(query_lower):
+        if "blacklist" in _KEYWORD_CATEGORIES[kw]:
+            return {"blacklist": 1, "personal": 0, "factual": 0}
+        hits.add(kw)
+    
+    counts = {"blacklist": 0, "personal": 0, "factual": 0}
+    for kw in hits:
+        for category in _KEYWORD_CATEGORIES[kw]:
+            counts[category] += 1
+    
+    if counts["personal"]:
+        counts["factual"] = 0
+        return counts
+    
+    counts["factual"] += len(set(_WORD_RE.findall(query_lower)) & FACTUAL_TOKENS)
+    return counts
+
+
+# Shared-scope answers at or above this confidence are also written under
+# the ContextKey (see CachingBrain._store)
+SHARED_CONTEXT_CONFIDENCE = 0.7
+
+# Compact conversation history entry (CachingBrain); plain role/content
+# dicts are still accepted wherever history is read
+HistoryMsg = namedtuple("HistoryMsg", "role content")
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+
 
-@dataclass 
+@dataclass(slots=True, frozen=True)
 class KeyResult:
     """Result from key generation."""
     content_key: Optional[str]  # Shared cache key (content-based only)
@@ -64,43 +222,70 @@ class SmartKeyGenerator:
     Write Strategy: Write to appropriate key(s) based on scope detection
     """
     
+    __slots__ = ("history_window",)
+    
     def __init__(self, history_window: int = 5):
         self.history_window = history_window
     
     def normalize_query(self, query: str) -> str:
         """Normalize query for better hit rate."""
-        normalized = query.lower().strip()
-        normalized = re.sub(r'[.?!,;:]+$', '', normalized)
-        normalized = re.sub(r'\s+', ' ', normalized)
+        return self._normalize_lower(query.lower())
+    
+    @staticmethod
+    def _normalize_lower(query_lower: str) -> str:
+        normalized = query_lower.strip()
+        normalized = _TRAILING_PUNCT_RE.sub('', normalized)
+        normalized = _WHITESPACE_RE.sub(' ', normalized)
         return normalized
     
     def is_blacklisted(self, query: str) -> bool:
         """Check for time-sensitive keywords."""
-        query_lower = query.lower()
-        return any(kw in query_lower for kw in BLACKLIST_KEYWORDS)
+        return _scan_keywords(query.lower())["blacklist"] > 0
     
-    def detect_scope(self, query: str, history: List[Dict]) -> Tuple[str, float]:
+    def detect_scope(self, query: str, history: Sequence[Union[HistoryMsg, Dict]]) -> Tuple[str, float]:
         """
         Detect query scope with confidence score.
         
         Returns:
             (scope, confidence) where scope is "shared" | "contextual" | "blacklisted"
         """
-        query_lower = query.lower()
+        return self._detect_scope_lower(query.lower(), history)
+    
+    def detect_scope_batch(
+        self,
+        queries: Sequence[str],
+        histories: Optional[Sequence[Sequence[Union[HistoryMsg, Dict]]]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        detect_scope() for many queries (bulk replay, cache pre-warming).
+        
+        histories, if given, holds one conversation history per query;
+        otherwise every query is scored without context.
+        """
+        if histories is None:
+            histories = [()] * len(queries)
+        return [
+            self._detect_scope_lower(query.lower(), history)
+            for query, history in zip(queries, histories)
+        ]
+    
+    @staticmethod
+    def _detect_scope_lower(query_lower: str, history: Sequence[Union[HistoryMsg, Dict]]) -> Tuple[str, float]:
+        counts = _scan_keywords(query_lower)
         
         # 1. Blacklist check (highest priority)
-        if self.is_blacklisted(query):
+        if counts["blacklist"]:
             return ("blacklisted", 1.0)
         
         # 2. Count indicators
-        personal_score = sum(1 for ind in PERSONAL_INDICATORS if ind in query_lower)
-        factual_score = sum(1 for ind in FACTUAL_INDICATORS if ind in query_lower)
+        personal_score = counts["personal"]
+        factual_score = counts["factual"]
         
         # 3. Context check: If there's conversation history, query might be contextual
         has_context = len(history) > 0
         
         # Short query with context = likely follow-up (contextual)
-        is_short_query = len(query.split()) <= 5
+        is_short_query = len(query_lower.split()) <= 5
         
         # 4. Decision logic
         if personal_score > 0:
@@ -121,7 +306,7 @@ class SmartKeyGenerator:
         # (This is where we differ from V2's conservative approach)
         return ("shared", 0.5)
     
-    def normalize_history_hash(self, history: List[Dict]) -> str:
+    def normalize_history_hash(self, history: Sequence[Union[HistoryMsg, Dict]]) -> str:
         """
         Create lightweight fingerprint for conversation history.
         
@@ -135,39 +320,62 @@ class SmartKeyGenerator:
         if not history:
             return "empty"
         
-        recent = history[-self.history_window:]
-        
-        # Build fingerprint components
-        parts = []
-        role_seq = ""
+        # Works for lists and deques alike (deques can't be sliced)
+        recent = islice(history, max(0, len(history) - self.history_window), None)
+        return self.combine_fingerprints([self.message_fingerprint(*self._role_content(msg)) for msg in recent])
+    
+    @staticmethod
+    def _role_content(msg: Union[HistoryMsg, Dict]) -> Tuple[str, str]:
+        if isinstance(msg, HistoryMsg):
+            return msg
+        return msg.get("role", "?"), msg.get("content", "")
+    
+    @staticmethod
+    def message_fingerprint(role: str, content: str) -> Tuple[str, str]:
+        """
+        Fingerprint one message as (role char, snippet hash).
         
-        for msg in recent:
-            role = msg.get("role", "?")[0].lower()  # u, a, s, t
-            role_seq += role
-            
-            content = msg.get("content", "")
-            # Take first 20 chars, normalized
-            snippet = re.sub(r'\s+', ' ', content[:20].lower().strip())
-            parts.append(snippet)
+        Callers that track history incrementally can compute this once per
+        message and reuse it for every later turn.
+        """
+        role = role[0].lower()  # u, a, s, t
         
-        fingerprint = f"{role_seq}|{len(recent)}|{'|'.join(parts)}"
-        return hashlib.md5(fingerprint.encode()).hexdigest()[:12]
+        # Take first 20 chars, normalized
+        snippet = _WHITESPACE_RE.sub(' ', content[:20].lower().strip())
+        return role, fast_hash(snippet)
+    
+    @staticmethod
+    def combine_fingerprints(parts: Sequence[Tuple[str, str]]) -> str:
+        """Fold per-message fingerprints into the history hash."""
+        if not parts:
+            return "empty"
+        role_seq = "".join(role for role, _ in parts)
+        snippets = "|".join(snippet for _, snippet in parts)
+        return fast_hash_parts(role_seq, str(len(parts)), snippets)[:12]
     
     def generate_keys(
         self, 
         user_id: str,
         conversation_id: str,
         user_query: str,
-        conversation_history: List[Dict],
-        system_prompt_hash: str = ""
+        conversation_history: Sequence[Union[HistoryMsg, Dict]],
+        system_prompt_hash_short: str = "",
+        history_fp: Optional[str] = None
     ) -> KeyResult:
         """
         Generate both ContentKey and ContextKey.
         
+        system_prompt_hash_short is the first 8 hex chars of the system
+        prompt hash (already sliced by the caller).
+        
+        history_fp, if given, is a precomputed normalize_history_hash() of
+        conversation_history and skips re-fingerprinting it.
+        
         Returns KeyResult with both keys and detected scope.
         """
-        normalized = self.normalize_query(user_query)
-        scope, confidence = self.detect_scope(user_query, conversation_history)
+        # Lowercased once for both scope detection and normalization
+        query_lower = user_query.lower()
+        scope, confidence = self._detect_scope_lower(query_lower, conversation_history)
         
         # Blacklisted = no caching
         if scope == "blacklisted":
@@ -178,14 +386,20 @@ class SmartKeyGenerator:
                 confidence=confidence
             )
         
+        # Encoded once, hashed into both keys
+        normalized = self._normalize_lower(query_lower)
+        normalized_bytes = normalized.encode()
+        
         # ContentKey: Pure content-based (for shared cache)
-        content_material = f"{system_prompt_hash[:8]}|{normalized}"
-        content_key = f"content:{hashlib.sha256(content_material.encode()).hexdigest()[:16]}"
+        content_key = f"content:{fast_hash_parts(system_prompt_hash_short, normalized_bytes)}"
         
-        # ContextKey: Includes conversation context
-        history_fp = self.normalize_history_hash(conversation_history)
-        context_material = f"{user_id}|{conversation_id}|{history_fp}|{normalized}"
-        context_key = f"context:{hashlib.sha256(context_material.encode()).hexdigest()[:16]}"
+        # ContextKey: Includes conversation context. A low-confidence shared
+        # query with no history is never written under it, so skip it.
+        context_key = None
+        if scope != "shared" or confidence >= SHARED_CONTEXT_CONFIDENCE or len(conversation_history):
+            if history_fp is None:
+                history_fp = self.normalize_history_hash(conversation_history)
+            context_key = f"context:{fast_hash_parts(user_id, conversation_id, history_fp, normalized_bytes)}"
         
         return KeyResult(
             content_key=content_key,
@@ -0,0 +1,184 @@
+"""
+Plan Cache - SQLite-backed reuse of Planner output.
+
+Plans are keyed by the normalized request (case and punctuation folded;
+Vietnamese diacritics are kept since they distinguish words like "bán"
+and "bàn") and matched against the current screen with a 64-bit
+perceptual hash, so re-captured screenshots of the same screen still hit.
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import functools
+import os
+import orjson
+from typing import Optional, Dict, Any
+from pathlib import Path
+
+from PIL import Image
+
+from agent.middleware.cache_manager import CacheManager
+from agent.middleware.key_generator import fast_hash_parts
+
+try:
+    import imagehash
+except ImportError:  # Falls back to a PIL average hash
+    imagehash = None
+
+# Stored with each screen hash; pHash and average-hash bits aren't comparable
+HASH_KIND = "p" if imagehash is not None else "a"
+
+DB_PATH = Path("plan_cache.db")
+
+_PUNCT_RE = re.compile(r'[^\w\s]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_request(text: str) -> str:
+    """NFC-normalize, lowercase, strip punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFC", text).lower()
+    text = _PUNCT_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+@functools.lru_cache(maxsize=32)
+def _screen_hash_cached(path: str, mtime: float, size: int) -> int:
+    with Image.open(path) as img:
+        if imagehash is not None:
+            return int(str(imagehash.phash(img)), 16)
+        # Average hash: 8x8 grayscale, one bit per pixel above the mean
+        pixels = list(img.convert("L").resize((8, 8), Image.BILINEAR).getdata())
+    mean = sum(pixels) / len(pixels)
+    bits = 0
+    for p in pixels:
+        bits = (bits << 1) | (p > mean)
+    return bits
+
+
+def screen_hash(path: Optional[str]) -> Optional[int]:
+    """64-bit perceptual hash of a screenshot (None if unavailable)."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+        return _screen_hash_cached(path, st.st_mtime, st.st_size)
+    except (OSError, ValueError):
+        return None
+
+
+class PlanCache:
+    """
+    Stores plans per (request key, screen hash).
+    
+    A lookup returns the plan whose screen hash is closest to the current
+    one, if it is within max_distance bits. Screen hashes are stored as
+    "<HASH_KIND>:<hex>" and only hashes of the same kind are compared.
+    Requests without a screenshot only match plans stored without one.
+    """
+    
+    SQL_LOOKUP = "SELECT screen_hash, plan FROM plans WHERE request_key = ? AND expires_at > ?"
+    SQL_SET = """
+        INSERT OR REPLACE INTO plans (request_key, screen_hash, plan, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    SQL_DELETE_EXPIRED = "DELETE FROM plans WHERE expires_at < ?"
+    
+    NO_SCREEN = ""  # screen_hash column value for text-only plans
+    
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        default_ttl: int = 3600 * 24,
+        max_distance: int = 6
+    ):
+        self.db_path = db_path
+        self.default_ttl = default_ttl
+        self.max_distance = max_distance
+        
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        for pragma in CacheManager.PRAGMAS:
+            self._conn.execute(pragma)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                request_key TEXT NOT NULL,
+                screen_hash TEXT NOT NULL,
+                plan BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (request_key, screen_hash)
+            )
+        """)
+        self._conn.execute(self.SQL_DELETE_EXPIRED, (time.time(),))
+    
+    @staticmethod
+    def request_key(user_request: str, context: str = "", model_name: str = "") -> str:
+        return fast_hash_parts(model_name, normalize_request(user_request), normalize_request(context))
+    
+    def get(
+        self,
+        user_request: str,
+        screenshot_path: Optional[str] = None,
+        context: str = "",
+        model_name: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """Return a cached plan for this request and screen, or None."""
+        key = self.request_key(user_request, context, model_name)
+        screen = screen_hash(screenshot_path)
+        
+        with self._lock:
+            rows = self._conn.execute(self.SQL_LOOKUP, (key, time.time())).fetchall()
+        
+        prefix = HASH_KIND + ":"
+        best, best_distance = None, self.max_distance + 1
+        for stored, plan in rows:
+            if screen is None or stored == self.NO_SCREEN:
+                if screen is None and stored == self.NO_SCREEN:
+                    best = plan
+                    break
+                continue
+            if not stored.startswith(prefix):
+                continue
+            distance = (screen ^ int(stored[len(prefix):], 16)).bit_count()
+            if distance < best_distance:
+                best, best_distance = plan, distance
+        
+        if best is None:
+            return None
+        try:
+            return orjson.loads(best)
+        except orjson.JSONDecodeError as e:
+            print(f"⚠️ Plan cache deserialization error: {e}")
+            return None
+    
+    def set(
+        self,
+        user_request: str,
+        plan: Dict[str, Any],
+        screenshot_path: Optional[str] = None,
+        context: str = "",
+        model_name: str = "",
+        ttl: Optional[int] = None
+    ) -> None:
+        """Store a successfully parsed plan."""
+        if plan.get("error") or not plan.get("steps"):
+            return
+        
+        key = self.request_key(user_request, context, model_name)
+        screen = screen_hash(screenshot_path)
+        now = time.time()
+        
+        with self._lock:
+            self._conn.execute(self.SQL_SET, (
+                key,
+                self.NO_SCREEN if screen is None else f"{HASH_KIND}:{screen:016x}",
+                orjson.dumps(plan),
+                now,
+                now + (ttl or self.default_ttl)
+            ))
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -8,16 +8,26 @@ Part of the Planner-Navigator architecture:
 Uses a high-capability model (gemini-2.5-pro) for strategic planning.
 """
 import os
-import json
+import io
+import sys
+import functools
+import orjson
+import asyncio
+import httpx
 import requests
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional, List, Dict, Any, Callable
-from pathlib import Path
 import base64
 
 from agent.brain import Brain, ThinkResult
+from agent.adapters.cliproxy import release_async_client
+from agent.middleware.plan_cache import PlanCache
+from agent.middleware.key_generator import fast_hash
 
 
-PLANNER_SYSTEM_PROMPT = """Bạn là Android Automation Planner. Nhiệm vụ của bạn là TẠO KẾ HOẠCH, KHÔNG THỰC THI.
+PLANNER_SYSTEM_PROMPT = sys.intern("""Bạn là Android Automation Planner. Nhiệm vụ của bạn là TẠO KẾ HOẠCH, KHÔNG THỰC THI.
 
 ## VAI TRÒ
 - Bạn là CHIẾN LƯỢC GIA (Planner), không phải người thực thi (Navigator)
@@ -129,7 +139,103 @@ User: "Vào Facebook đăng 'Hello World'"
   ]
 }
 ```
-"""
+""")
+
+
+def _extract_json_object(s: str, start: int) -> Optional[str]:
+    """
+    Return the balanced {...} substring opening at s[start], or None.
+    
+    Single pass tracking brace depth and string/escape state, so nested
+    objects and braces inside strings are handled.
+    """
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(s)):
+        ch = s[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return s[start:i + 1]
+    return None
+
+
+def _example_goal_hashes(prompt: str) -> frozenset:
+    """Hashes of the "goal" strings in the prompt's JSON format/example blocks."""
+    hashes = set()
+    start = prompt.find("```json")
+    while start != -1:
+        block = _extract_json_object(prompt, prompt.find("{", start))
+        if block:
+            hashes.add(fast_hash(orjson.loads(block)["goal"].strip()))
+        start = prompt.find("```json", start + 1)
+    return frozenset(hashes)
+
+
+# A reply that just echoes the prompt's format template or example is not a plan
+_EXAMPLE_GOAL_HASHES = _example_goal_hashes(PLANNER_SYSTEM_PROMPT)
+
+
+def _is_echoed_example(plan: Any) -> bool:
+    goal = plan.get("goal") if isinstance(plan, dict) else None
+    return isinstance(goal, str) and fast_hash(goal.strip()) in _EXAMPLE_GOAL_HASHES
+
+
+# Provider-side prompt caching marker (Anthropic/Gemini-compatible proxies)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# The system message never changes - build both variants once
+_SYSTEM_MESSAGE = {"role": "system", "content": PLANNER_SYSTEM_PROMPT}
+_SYSTEM_MESSAGE_CACHED = {
+    "role": "system",
+    "content": [{"type": "text", "text": PLANNER_SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+}
+
+
+IMAGE_MEDIA_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp"
+}
+
+# Screenshots larger than this are downscaled before upload; the planner
+# only needs the screen layout, not full resolution
+DOWNSCALE_OVER_BYTES = 2 * 1024 * 1024
+THUMBNAIL_SIZE = (1024, 2048)
+
+
+@functools.lru_cache(maxsize=32)
+def _encode_image_cached(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Base64-encode a screenshot.
+    
+    Keyed on (path, mtime_ns, size) so a retried plan reuses the encoding
+    and an overwritten file is picked up again.
+    """
+    if size > DOWNSCALE_OVER_BYTES:
+        from PIL import Image
+        with Image.open(path) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")
+        return base64.b64encode(buf.getbuffer()).decode("ascii")
+    
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
 
 
 class PlannerBrain:
@@ -138,36 +244,110 @@ class PlannerBrain:
     
     This is the "strategist" in the Planner-Navigator architecture.
     It generates a JSON plan that the Navigator will execute step-by-step.
+    
+    Args:
+        supports_prompt_cache: Tag PLANNER_SYSTEM_PROMPT with cache_control
+            so the provider can reuse its KV cache across plans
+        plan_cache: Reuse plans for repeated requests on the same screen
+            (optional)
+        stream: Stream the completion and stop reading as soon as a
+            complete plan object has arrived. Falls back to a normal
+            request if the server rejects streaming.
+        supports_file_upload: Upload screenshots once via POST /files and
+            reference them by file_id instead of inlining base64. Turned
+            off automatically if the proxy has no /files endpoint.
     """
     
+    MAX_UPLOADED_FILES = 128
+    
     def __init__(
         self, 
         api_key: str = None,
         model_name: str = "gemini-2.5-pro",  # Use high-capability model
-        base_url: str = "http://localhost:8317/v1"
+        base_url: str = "http://localhost:8317/v1",
+        supports_prompt_cache: bool = False,
+        plan_cache: Optional[PlanCache] = None,
+        stream: bool = False,
+        supports_file_upload: bool = False
     ):
         self.api_key = api_key or os.getenv("CLIPROXY_API_KEY", "gemaauto")
         self.model_name = model_name
         self.base_url = base_url.rstrip('/')
+        self.supports_prompt_cache = supports_prompt_cache
+        self.plan_cache = plan_cache
+        self.stream = stream
+        self.supports_file_upload = supports_file_upload
+        
+        # (path, mtime_ns) -> uploaded file_id
+        self._file_ids: "OrderedDict[tuple, str]" = OrderedDict()
+        
+        # Keep-alive session; planning POSTs have no side effects, so
+        # transient gateway errors are retried
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        retry = Retry(
+            total=2, backoff_factor=0.3,
+            status_forcelist=[502, 503, 504], allowed_methods=frozenset({"POST"})
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
         
         print(f"🧠 Planner initialized with {model_name}")
     
-    def _encode_image(self, image_path: str) -> str:
-        """Encode image to base64."""
-        with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+    def _encode_image(self, image_path: str, st: os.stat_result) -> str:
+        """Encode image to base64 (memoized per file version)."""
+        return _encode_image_cached(image_path, st.st_mtime_ns, st.st_size)
     
-    def _get_image_media_type(self, image_path: str) -> str:
-        """Get media type from image extension."""
-        ext = Path(image_path).suffix.lower()
-        media_types = {
-            ".png": "image/png",
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".gif": "image/gif",
-            ".webp": "image/webp"
-        }
-        return media_types.get(ext, "image/png")
+    def _upload_image(self, image_path: str, st: os.stat_result, ext: str) -> Optional[str]:
+        """
+        Upload raw screenshot bytes once per file version (no base64).
+        
+        Returns:
+            file_id, or None if the upload failed (caller falls back to inline)
+        """
+        key = (image_path, st.st_mtime_ns)
+        if key in self._file_ids:
+            self._file_ids.move_to_end(key)
+            return self._file_ids[key]
+        
+        media_type = IMAGE_MEDIA_TYPES.get(ext, "image/png")
+        try:
+            with open(image_path, "rb") as f:
+                response = self._session.post(
+                    f"{self.base_url}/files",
+                    # Drop the session's JSON Content-Type so requests sets multipart
+                    headers={"Content-Type": None},
+                    data={"purpose": "vision"},
+                    files={"file": (os.path.basename(image_path), f, media_type)},
+                    timeout=60
+                )
+            if response.status_code in (404, 405):
+                print("⚠️ Planner proxy has no /files endpoint, sending screenshots inline")
+                self.supports_file_upload = False
+                return None
+            response.raise_for_status()
+            file_id = orjson.loads(response.content)["id"]
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError, KeyError) as e:
+            print(f"⚠️ Image upload failed, sending inline: {e}")
+            return None
+        
+        self._file_ids[key] = file_id
+        if len(self._file_ids) > self.MAX_UPLOADED_FILES:
+            self._file_ids.popitem(last=False)
+        return file_id
+    
+    def _get_image_media_type_from_ext(self, ext: str, size: int) -> str:
+        """Get media type from a lowercased image extension."""
+        if size > DOWNSCALE_OVER_BYTES:
+            return "image/png"  # Re-encoded by _encode_image_cached
+        return IMAGE_MEDIA_TYPES.get(ext, "image/png")
     
     def create_plan(
         self, 
@@ -184,114 +364,311 @@ class PlannerBrain:
             context: Additional context (e.g., previous actions)
             
         Returns:
-            Dict with 'goal' and 'steps' list, or error
+            Dict with 'goal' and 'steps' list, or error. 'cache_hit' tells
+            whether the plan came from plan_cache.
         """
         try:
-            # Build message content
-            user_content = []
+            cached = self._cached_plan(user_request, screenshot_path, context)
+            if cached:
+                return cached
             
-            # Add screenshot if available
-            if screenshot_path and Path(screenshot_path).exists():
-                image_data = self._encode_image(screenshot_path)
-                media_type = self._get_image_media_type(screenshot_path)
-                user_content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{media_type};base64,{image_data}"
-                    }
-                })
-                print(f"🧠 Planner analyzing: {screenshot_path}")
-            
-            # Add context and request
-            prompt = f"""Nhiệm vụ: {user_request}
-
-{f'Ngữ cảnh: {context}' if context else ''}
-
-Hãy tạo kế hoạch thực hiện nhiệm vụ trên. Trả về JSON theo format đã chỉ định."""
-            
-            user_content.append({
-                "type": "text",
-                "text": prompt
-            })
-            
-            # Prepare messages
-            messages = [
-                {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
-                {"role": "user", "content": user_content}
-            ]
+            messages = self._build_messages(user_request, screenshot_path, context)
             
             # Call API
-            response = self._call_api(messages)
+            content = self._request_content(messages)
             
-            if not response:
-                return {"error": "API call failed", "steps": []}
+            return self._finish_plan(content, user_request, screenshot_path, context)
+                
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return {"error": str(e), "steps": []}
+    
+    async def create_plan_async(
+        self,
+        user_request: str,
+        screenshot_path: Optional[str] = None,
+        context: str = ""
+    ) -> Dict[str, Any]:
+        """
+        Async variant of create_plan() over a pooled httpx.AsyncClient.
+        
+        Lets several plans (e.g. for multiple devices, or two planner
+        models) be in flight at once; HTTP/2 multiplexes them over one
+        connection. Always uses a non-streaming request.
+        """
+        try:
+            # Cache lookup hashes the screenshot and message building
+            # reads + base64-encodes it - keep both off the event loop
+            cached = await asyncio.to_thread(self._cached_plan, user_request, screenshot_path, context)
+            if cached:
+                return cached
             
-            # Extract content
-            content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
+            messages = await asyncio.to_thread(self._build_messages, user_request, screenshot_path, context)
             
-            # Parse JSON from response
-            plan = self._parse_plan_json(content)
+            response = await self._call_api_async(messages)
+            content = None
+            if response:
+                self._log_cache_usage(response)
+                content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
+            
+            return await asyncio.to_thread(self._finish_plan, content, user_request, screenshot_path, context)
             
-            if plan:
-                print(f"🧠 Plan created: {len(plan.get('steps', []))} steps")
-                return plan
-            else:
-                return {"error": "Failed to parse plan", "raw": content, "steps": []}
-                
         except Exception as e:
             import traceback
             traceback.print_exc()
             return {"error": str(e), "steps": []}
     
+    async def create_plan_batch(self, user_requests: List[str]) -> List[Dict[str, Any]]:
+        """Plan several independent requests concurrently."""
+        return await asyncio.gather(*(self.create_plan_async(r) for r in user_requests))
+    
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+    
+    def _cached_plan(
+        self,
+        user_request: str,
+        screenshot_path: Optional[str],
+        context: str
+    ) -> Optional[Dict[str, Any]]:
+        if not self.plan_cache:
+            return None
+        cached = self.plan_cache.get(user_request, screenshot_path, context, self.model_name)
+        if cached:
+            print(f"⚡ Plan cache HIT: {len(cached.get('steps', []))} steps")
+            cached["cache_hit"] = True
+        return cached
+    
+    def _build_messages(
+        self,
+        user_request: str,
+        screenshot_path: Optional[str],
+        context: str
+    ) -> List[dict]:
+        """Build the system + user messages for a planning request."""
+        user_content = []
+        
+        # Add screenshot if available - one stat serves the existence
+        # check, the encoding cache key and the downscale decision
+        try:
+            st = os.stat(screenshot_path) if screenshot_path else None
+        except OSError:
+            st = None
+        
+        if st is not None:
+            ext = os.path.splitext(screenshot_path)[1].lower()
+            file_id = self._upload_image(screenshot_path, st, ext) if self.supports_file_upload else None
+            if file_id:
+                user_content.append({"type": "image_url", "image_url": {"file_id": file_id}})
+            else:
+                image_data = self._encode_image(screenshot_path, st)
+                media_type = self._get_image_media_type_from_ext(ext, st.st_size)
+                user_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{media_type};base64,{image_data}"
+                    }
+                })
+            print(f"🧠 Planner analyzing: {screenshot_path}")
+        
+        # Add context and request
+        prompt = f"""Nhiệm vụ: {user_request}
+
+{f'Ngữ cảnh: {context}' if context else ''}
+
+Hãy tạo kế hoạch thực hiện nhiệm vụ trên. Trả về JSON theo format đã chỉ định."""
+        
+        user_content.append({
+            "type": "text",
+            "text": prompt
+        })
+        
+        return [
+            _SYSTEM_MESSAGE_CACHED if self.supports_prompt_cache else _SYSTEM_MESSAGE,
+            {"role": "user", "content": user_content}
+        ]
+    
+    def _finish_plan(
+        self,
+        content: Optional[str],
+        user_request: str,
+        screenshot_path: Optional[str],
+        context: str
+    ) -> Dict[str, Any]:
+        """Parse the completion text into a plan and store it in plan_cache."""
+        if content is None:
+            return {"error": "API call failed", "steps": []}
+        
+        # Parse JSON from response
+        plan = self._parse_plan_json(content)
+        
+        if plan:
+            print(f"🧠 Plan created: {len(plan.get('steps', []))} steps")
+            if self.plan_cache:
+                self.plan_cache.set(user_request, plan, screenshot_path, context, self.model_name)
+            plan["cache_hit"] = False
+            return plan
+        else:
+            return {"error": "Failed to parse plan", "raw": content, "steps": []}
+    
+    @staticmethod
+    def _log_cache_usage(response: dict) -> None:
+        """Report prompt-cache hits (Anthropic and OpenAI usage fields)."""
+        usage = response.get("usage") or {}
+        cached = usage.get("cache_read_input_tokens") or (
+            (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        )
+        if cached:
+            print(f"🧠 Prompt cache hit: {cached} tokens")
+    
     def _parse_plan_json(self, content: str) -> Optional[Dict]:
         """Extract and parse JSON from response content."""
+        # Plain-text replies can't hold a plan object - skip parsing and regexes
+        if not content or "{" not in content:
+            return None
+        
         # Try direct JSON parse first
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
+            plan = orjson.loads(content)
+            return None if _is_echoed_example(plan) else plan
+        except orjson.JSONDecodeError:
             pass
         
-        # Try to find JSON in code block
-        import re
+        # Scan for the first balanced object that parses, starting inside
+        # a ``` fence if there is one
+        fence = content.find("```")
+        start = content.find("{", fence if fence != -1 else 0)
+        if start == -1:
+            start = content.find("{")
         
-        # Match ```json ... ``` or ``` ... ```
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
-        if json_match:
+        while start != -1:
+            candidate = _extract_json_object(content, start)
+            if candidate is None:
+                break
             try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        # Try to find raw JSON object
-        json_match = re.search(r'\{[^{}]*"steps"\s*:\s*\[.*?\]\s*\}', content, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group(0))
-            except json.JSONDecodeError:
+                plan = orjson.loads(candidate)
+                if isinstance(plan, dict) and not _is_echoed_example(plan):
+                    return plan
+            except orjson.JSONDecodeError:
                 pass
+            start = content.find("{", start + 1)
         
         return None
     
-    def _call_api(self, messages: list) -> Optional[dict]:
-        """Make API call to CLIProxyAPI."""
-        url = f"{self.base_url}/chat/completions"
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    def _request_content(self, messages: list) -> Optional[str]:
+        """Get the completion text, streamed if enabled (None on failure)."""
+        if self.stream:
+            return self._call_api_stream(messages)
         
+        response = self._call_api(messages)
+        if not response:
+            return None
+        self._log_cache_usage(response)
+        return response.get("choices", [{}])[0].get("message", {}).get("content", "")
+    
+    def _build_body(self, messages: list, stream: bool = False) -> bytes:
+        """Serialize the chat completion request (orjson, base64 image included)."""
         payload = {
             "model": self.model_name,
             "messages": messages,
             "max_tokens": 2048,
             "temperature": 0.3  # Lower temperature for consistent planning
         }
+        if stream:
+            payload["stream"] = True
+        return orjson.dumps(payload)
+    
+    def _call_api_stream(self, messages: list) -> Optional[str]:
+        """
+        Stream a completion (SSE), returning early once a plan is complete.
+        
+        Brace depth is tracked per delta as a cheap trigger; the buffer is
+        only parsed when it returns to zero.
+        """
+        url = f"{self.base_url}/chat/completions"
+        
+        try:
+            with self._session.post(
+                url, data=self._build_body(messages, stream=True), timeout=60, stream=True
+            ) as response:
+                if response.status_code == 400:
+                    print("⚠️ Planner streaming rejected, using normal requests")
+                    self.stream = False
+                    return self._request_content(messages)
+                response.raise_for_status()
+                
+                parts = []
+                depth = 0
+                for line in response.iter_lines():
+                    if not line.startswith(b"data: "):
+                        continue
+                    data = line[6:]
+                    if data == b"[DONE]":
+                        break
+                    choices = orjson.loads(data).get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content") or ""
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    
+                    opened = depth > 0 or "{" in delta
+                    depth += delta.count("{") - delta.count("}")
+                    if opened and depth <= 0 and "}" in delta:
+                        content = "".join(parts)
+                        if self._parse_plan_json(content) is not None:
+                            return content  # Skip the model's trailing tokens
+                
+                return "".join(parts)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            print(f"❌ Planner API Error: {e}")
+            return None
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Return the pooled async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            if self._async_client is not None:
+                release_async_client(self._async_client, self._async_loop)
+            # Not the Session's headers: requests' defaults (Connection,
+            # User-Agent, Accept-Encoding) don't belong on an HTTP/2 client
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                http2=True,
+                timeout=60
+            )
+            self._async_loop = loop
+        return self._async_client
+    
+    async def _call_api_async(self, messages: list) -> Optional[dict]:
+        """Async variant of _call_api()."""
+        try:
+            response = await self._get_async_client().post(
+                "/chat/completions", content=self._build_body(messages)
+            )
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            print(f"❌ Planner API Error: {e}")
+            return None
+    
+    def _call_api(self, messages: list) -> Optional[dict]:
+        """Make API call to CLIProxyAPI."""
+        url = f"{self.base_url}/chat/completions"
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
+            # Session already sends Content-Type: application/json
+            response = self._session.post(url, data=self._build_body(messages), timeout=60)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return orjson.loads(response.content)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             print(f"❌ Planner API Error: {e}")
             return None
@@ -2,6 +2,8 @@
 System Prompts and Tool Schemas for Ollama
 Defines the agent's behavior and available tools
 """
+from types import MappingProxyType
+from typing import Mapping, Tuple
 
 SYSTEM_PROMPT = """You are an intelligent Android automation agent. Your purpose is to help users automate tasks on their Android devices by using the available tools.
 
@@ -29,7 +31,8 @@ You can interact with Android devices through:
 You have access to the following tools to accomplish tasks on Android devices."""
 
 
-TOOL_SCHEMAS = [
+# Read-only: built once at import and shared by every request
+TOOL_SCHEMAS: Tuple[Mapping, ...] = tuple(MappingProxyType(schema) for schema in [
     {
         "type": "function",
         "function": {
@@ -290,4 +293,4 @@ TOOL_SCHEMAS = [
             }
         }
     }
-]
+])
@@ -5,41 +5,65 @@ Converts TOOL_REGISTRY functions to OpenAI/Gemini/Claude function calling format
 Uses Python's inspect and type hints to generate schemas automatically.
 """
 import inspect
-from typing import Any, get_type_hints, Optional
+import functools
+import types
+from typing import Any, Union, get_args, get_origin, get_type_hints, Optional
+
+
+TYPE_MAP = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+# typing.Union[...] / Optional[...] and PEP 604 "X | None"
+_UNION_TYPES = (Union, types.UnionType)
 
 
 def python_type_to_json_type(py_type: Any) -> str:
     """Convert Python type hint to JSON schema type."""
-    type_map = {
-        str: "string",
-        int: "integer",
-        float: "number",
-        bool: "boolean",
-        list: "array",
-        dict: "object",
-    }
+    origin = get_origin(py_type)
     
-    # Handle Optional types
-    origin = getattr(py_type, "__origin__", None)
-    if origin is not None:
-        # Handle Optional[X] which is Union[X, None]
-        args = getattr(py_type, "__args__", ())
+    # Handle Optional[X] / X | None by using the non-None type
+    if origin in _UNION_TYPES:
+        args = get_args(py_type)
         if type(None) in args:
-            # Get the non-None type
-            for arg in args:
-                if arg is not type(None):
-                    return python_type_to_json_type(arg)
+            non_none = next((arg for arg in args if arg is not type(None)), str)
+            return python_type_to_json_type(non_none)
         return "string"
     
-    return type_map.get(py_type, "string")
+    # Parameterized generics: list[X] -> array, dict[K, V] -> object
+    if origin is not None:
+        return TYPE_MAP.get(origin, "string")
+    
+    return TYPE_MAP.get(py_type, "string")
+
+
+def _list_item_type(py_type: Any) -> Optional[str]:
+    """JSON type of the items of list[X] (also through Optional), if given."""
+    origin = get_origin(py_type)
+    if origin in _UNION_TYPES:
+        return next(
+            (_list_item_type(arg) for arg in get_args(py_type) if arg is not type(None)),
+            None
+        )
+    args = get_args(py_type)
+    if origin is list and args:
+        return python_type_to_json_type(args[0])
+    return None
 
 
+@functools.lru_cache(maxsize=None)
 def get_tool_schema(func) -> dict:
     """
     Generate JSON Schema from a Python function.
     
     Uses docstring for description and type hints for parameter types.
     Compatible with OpenAI, Gemini, and Claude function calling formats.
+    Memoized per function - the returned dict is shared, do not mutate.
     
     Args:
         func: Python function to generate schema for
@@ -81,6 +105,10 @@ def get_tool_schema(func) -> dict:
         
         # Build property definition
         prop = {"type": json_type}
+        if json_type == "array":
+            item_type = _list_item_type(param_type)
+            if item_type:
+                prop["items"] = {"type": item_type}
         
         # Add enum for known parameters
         if name == "direction":
@@ -115,10 +143,16 @@ def generate_tool_schemas(registry: dict) -> list[dict]:
     Returns:
         List of JSON Schema dicts for function calling
     """
+    # The Gemini/OpenAI/Claude converters all land here; build once per registry
+    return list(_generate_tool_schemas_cached(tuple(registry.items())))
+
+
+@functools.lru_cache(maxsize=8)
+def _generate_tool_schemas_cached(items: tuple) -> tuple:
     schemas = []
     skipped = []
     
-    for name, func in registry.items():
+    for name, func in items:
         try:
             schema = get_tool_schema(func)
             schemas.append(schema)
@@ -128,7 +162,7 @@ def generate_tool_schemas(registry: dict) -> list[dict]:
     if skipped:
         print(f"⚠️ Skipped {len(skipped)} tools: {skipped[:3]}...")
     
-    return schemas
+    return tuple(schemas)
 
 
 def get_tools_for_gemini(registry: dict) -> list[dict]:
@@ -4,11 +4,18 @@ StructuredTool - Wrapper for Pydantic validation on tools.
 Provides "Fail Fast" validation before executing tool functions.
 Acts as the Contract between AI and Tools.
 """
-from typing import Callable, Type, Any, Dict
+from typing import Callable, Type, Any, Dict, Tuple
 from pydantic import BaseModel, ValidationError
 import functools
 
 
+@functools.lru_cache(maxsize=128)
+def _validation_message(errors: Tuple[Tuple[Any, str], ...]) -> str:
+    """Validation error text, formatted once per distinct set of errors."""
+    msg = "; ".join(f"{loc}: {text}" for loc, text in errors)
+    return f"Validation Error: {msg}"
+
+
 class StructuredTool:
     """
     Wrapper that adds Pydantic validation to tool functions.
@@ -39,8 +46,26 @@ class StructuredTool:
         self.args_schema = args_schema
         self.description = description or func.__doc__ or f"Execute {name}"
         
-        # Copy function metadata for Google SDK compatibility
-        functools.update_wrapper(self, func)
+        # pydantic-core's compiled validator, resolved once
+        self._validator = args_schema.__pydantic_validator__
+        self._field_names = tuple(args_schema.model_fields)
+        
+        # model_json_schema() walks the model on every call - build it once
+        self._openai_schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": self.description,
+                "parameters": args_schema.model_json_schema()
+            }
+        }
+        
+        # Function metadata for Google SDK compatibility: name and doc for
+        # the declaration, __wrapped__ so inspect.signature(self) resolves
+        # to func's parameters
+        self.__name__ = getattr(func, "__name__", name)
+        self.__doc__ = self.description
+        self.__wrapped__ = func
     
     def __call__(self, **kwargs) -> Dict[str, Any]:
         """
@@ -51,12 +76,19 @@ class StructuredTool:
         """
         try:
             # 1. Validate with Pydantic (Fail Fast!)
-            validated = self.args_schema(**kwargs)
+            validated = self._validator.validate_python(kwargs)
             
-            # 2. Execute function with clean data
-            result = self.func(**validated.model_dump(exclude_none=True))
+            # 2. Execute function with clean data (same as
+            #    model_dump(exclude_none=True) for these flat schemas)
+            values = validated.__dict__
+            result = self.func(**{
+                name: value for name in self._field_names
+                if (value := values[name]) is not None
+            })
             
             # 3. Ensure result is dict
+            if result is None:
+                return {"success": True}
             if not isinstance(result, dict):
                 result = {"success": True, "result": result}
             
@@ -64,11 +96,9 @@ class StructuredTool:
             
         except ValidationError as e:
             # Pydantic validation failed - return immediately
-            errors = e.errors()
-            msg = "; ".join(f"{err['loc'][0]}: {err['msg']}" for err in errors)
             return {
-                "success": False, 
-                "error": f"Validation Error: {msg}"
+                "success": False,
+                "error": _validation_message(tuple((err['loc'][0], err['msg']) for err in e.errors()))
             }
             
         except Exception as e:
@@ -78,15 +108,8 @@ class StructuredTool:
             }
     
     def to_openai_schema(self) -> dict:
-        """Generate OpenAI function calling schema."""
-        return {
-            "type": "function",
-            "function": {
-                "name": self.name,
-                "description": self.description,
-                "parameters": self.args_schema.model_json_schema()
-            }
-        }
+        """OpenAI function calling schema (built once in __init__, do not mutate)."""
+        return self._openai_schema
     
     def to_gemini_tool(self):
         """Return function for Gemini SDK (auto function calling)."""
@@ -95,6 +118,16 @@ class StructuredTool:
         return self
 
 
+def pydantic_to_openai_schema(model) -> dict:
+    """Convert Pydantic model to OpenAI function schema."""
+    schema = model.model_json_schema()
+    return {
+        "type": "object",
+        "properties": schema.get("properties", {}),
+        "required": schema.get("required", [])
+    }
+
+
 def create_structured_tools(registry: dict, schemas: dict) -> dict:
     """
     Create StructuredTools from registry and schemas.
@@ -1,24 +1,33 @@
 """Core infrastructure modules for Android automation"""
-from .device import get_device_connection, validate_adb
+from .device import get_device_connection, reset_device_cache, validate_adb, with_device
 from .ui_elements import (
     BoundingBox, 
     CenterCord, 
     ElementNode,
+    ElementBatch,
     get_ui_elements,
+    get_ui_element_batch,
     extract_coordinates,
     get_center_coordinates
 )
 from .screenshot import capture_screenshot, annotate_screenshot
+from .ui_cache import enable_ui_cache, invalidate_ui_cache
 
 __all__ = [
     'get_device_connection',
+    'reset_device_cache',
     'validate_adb',
+    'with_device',
     'BoundingBox',
     'CenterCord', 
     'ElementNode',
+    'ElementBatch',
     'get_ui_elements',
+    'get_ui_element_batch',
     'extract_coordinates',
     'get_center_coordinates',
     'capture_screenshot',
-    'annotate_screenshot'
+    'annotate_screenshot',
+    'enable_ui_cache',
+    'invalidate_ui_cache'
 ]
@@ -3,8 +3,25 @@ Android Device Connection Management
 Handles uiautomator2 and ADB connections
 """
 import subprocess
+import threading
 import uiautomator2 as u2
-from typing import Optional
+from typing import Callable, Dict, Optional, TypeVar
+
+try:
+    import adbutils
+except ImportError:  # Falls back to spawning the adb client
+    adbutils = None
+
+# Talks to the adb server over its socket (no adb process per query);
+# honours ANDROID_ADB_SERVER_HOST/PORT like the adb client does
+_ADB = adbutils.adb if adbutils is not None else None
+_ADB_ERRORS = (adbutils.AdbError, OSError) if adbutils is not None else (OSError,)
+
+# Failures that mean a cached connection has gone stale (device replugged,
+# adb server restarted) rather than a bad request
+_CONNECTION_ERRORS = (u2.ConnectError, u2.HTTPError) + _ADB_ERRORS
+
+T = TypeVar("T")
 
 
 class DeviceConnectionError(Exception):
@@ -19,6 +36,13 @@ def validate_adb() -> bool:
     Returns:
         bool: True if ADB is available, False otherwise
     """
+    if _ADB is not None:
+        try:
+            _ADB.server_version()
+            return True
+        except _ADB_ERRORS:
+            pass  # No server reachable; check for the adb binary instead
+    
     try:
         result = subprocess.run(
             ['adb', 'version'], 
@@ -31,10 +55,21 @@ def validate_adb() -> bool:
         return False
 
 
+# device_id (None = default device) -> validated connection
+_DEVICE_CACHE: Dict[Optional[str], u2.Device] = {}
+_DEVICE_LOCK = threading.Lock()
+_DEVICE_IO_LOCKS: Dict[Optional[str], threading.Lock] = {}
+
+
 def get_device_connection(device_id: Optional[str] = None) -> u2.Device:
     """
     Establish connection to Android device via uiautomator2.
     
+    Connections are cached per device_id, so only the first call pays for
+    u2.connect() and the device.info round-trip. A stale connection is
+    replaced by the next with_device() call that hits a connection error,
+    or dropped explicitly with reset_device_cache().
+    
     Args:
         device_id: Optional specific device ID. If None, connects to default device.
         
@@ -44,20 +79,82 @@ def get_device_connection(device_id: Optional[str] = None) -> u2.Device:
     Raises:
         DeviceConnectionError: If connection fails
     """
-    try:
-        if device_id:
-            device = u2.connect(device_id)
-        else:
-            device = u2.connect()
-        
-        # Validate connection by accessing device info
-        _ = device.info
+    device = _DEVICE_CACHE.get(device_id)
+    if device is not None:
         return device
+    
+    with _DEVICE_LOCK:
+        device = _DEVICE_CACHE.get(device_id)
+        if device is not None:
+            return device
         
-    except Exception as e:
-        raise DeviceConnectionError(
-            f"Failed to connect to device '{device_id or 'default'}': {e}"
-        )
+        try:
+            if device_id:
+                device = u2.connect(device_id)
+            else:
+                device = u2.connect()
+            
+            # Validate connection by accessing device info
+            _ = device.info
+            
+        except Exception as e:
+            raise DeviceConnectionError(
+                f"Failed to connect to device '{device_id or 'default'}': {e}"
+            )
+        
+        _DEVICE_CACHE[device_id] = device
+        return device
+
+
+def with_device(device_id: Optional[str], action: Callable[[u2.Device], T]) -> T:
+    """
+    Run action(device) on the cached connection for device_id.
+    
+    On a connection error the cached device is evicted and action runs
+    once more on a fresh connection, so only pass actions that are safe
+    to repeat (reads like screenshots and hierarchy dumps).
+    
+    Raises:
+        DeviceConnectionError: If reconnecting fails
+    """
+    device = get_device_connection(device_id)
+    try:
+        return action(device)
+    except _CONNECTION_ERRORS:
+        with _DEVICE_LOCK:
+            # Another thread may already have reconnected
+            if _DEVICE_CACHE.get(device_id) is device:
+                del _DEVICE_CACHE[device_id]
+    return action(get_device_connection(device_id))
+
+
+def get_device_lock(device_id: Optional[str] = None) -> threading.Lock:
+    """
+    Lock serializing hierarchy dumps on one cached device connection
+    (uiautomator handles one dump at a time; screenshots don't need it).
+    
+    Args:
+        device_id: Device whose lock to return (None = default device)
+    """
+    lock = _DEVICE_IO_LOCKS.get(device_id)
+    if lock is None:
+        with _DEVICE_LOCK:
+            lock = _DEVICE_IO_LOCKS.setdefault(device_id, threading.Lock())
+    return lock
+
+
+def reset_device_cache(device_id: Optional[str] = None) -> None:
+    """
+    Drop cached connections so the next call reconnects.
+    
+    Args:
+        device_id: Device to forget. If None, clears every cached connection.
+    """
+    with _DEVICE_LOCK:
+        if device_id is None:
+            _DEVICE_CACHE.clear()
+        else:
+            _DEVICE_CACHE.pop(device_id, None)
 
 
 def get_connected_devices() -> list[dict]:
@@ -73,33 +170,15 @@ def get_connected_devices() -> list[dict]:
             - dimensions: Screen dimensions (if available)
     """
     try:
-        result = subprocess.run(
-            ['adb', 'devices'], 
-            capture_output=True, 
-            text=True, 
-            check=True
-        )
-        
         devices = []
-        lines = result.stdout.strip().split('\n')[1:]  # Skip header
-        
-        for line in lines:
-            if not line.strip():
-                continue
-                
-            parts = line.strip().split('\t')
-            if len(parts) < 2:
-                continue
-                
-            device_id = parts[0]
-            status = parts[1]
-            
+        for device_id, status in _list_devices():
+            meta = _get_device_meta(device_id)
             device_info = {
                 "id": device_id,
-                "name": _get_device_name(device_id),
+                "name": meta["name"],
                 "status": status,
                 "type": "emulator" if device_id.startswith('emulator-') else "device",
-                "dimensions": _get_device_dimensions(device_id)
+                "dimensions": meta["dimensions"]
             }
             devices.append(device_info)
             
@@ -111,8 +190,74 @@ def get_connected_devices() -> list[dict]:
         return []
 
 
-def _get_device_name(device_id: str) -> str:
-    """Get device/emulator name"""
+def _list_devices() -> list[tuple[str, str]]:
+    """(device_id, status) pairs from the adb server, like `adb devices`."""
+    if _ADB is not None:
+        try:
+            return [(info.serial, info.state) for info in _ADB.list()]
+        except _ADB_ERRORS:
+            pass
+    
+    result = subprocess.run(
+        ['adb', 'devices'], 
+        capture_output=True, 
+        text=True, 
+        check=True
+    )
+    
+    entries = []
+    for line in result.stdout.strip().split('\n')[1:]:  # Skip header
+        parts = line.strip().split('\t')
+        if len(parts) >= 2:
+            entries.append((parts[0], parts[1]))
+    return entries
+
+
+def _adb_shell(device_id: str, command: str) -> Optional[str]:
+    """Output of `adb -s device_id shell command`, or None on failure."""
+    if _ADB is not None:
+        try:
+            return _ADB.device(serial=device_id).shell(command, timeout=5, rstrip=False)
+        except _ADB_ERRORS:
+            return None
+    
+    try:
+        result = subprocess.run(
+            ['adb', '-s', device_id, 'shell', command],
+            capture_output=True, text=True, timeout=5
+        )
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+# device_id -> {"name", "dimensions"}; only complete answers are kept
+_DEVICE_META: Dict[str, dict] = {}
+
+_META_SEPARATOR = "---"
+
+
+def _get_device_meta(device_id: str) -> dict:
+    """
+    Get device name and screen dimensions.
+    
+    Model and `wm size` come from one `adb shell` call (emulators need a
+    separate `emu avd name` for their AVD name, which only the adb client
+    can send). Results are cached for the session once both fields are
+    known.
+    """
+    meta = _DEVICE_META.get(device_id)
+    if meta is not None:
+        return meta
+    
+    name, dimensions = "Unknown", None
+    output = _adb_shell(device_id, f'getprop ro.product.model; echo {_META_SEPARATOR}; wm size')
+    if output is not None:
+        model, _, size_output = output.partition(_META_SEPARATOR)
+        name = model.strip() or name
+        if 'Physical size:' in size_output:
+            dimensions = size_output.split('Physical size:')[1].split()[0]
+    
     try:
         if device_id.startswith('emulator-'):
             # Get AVD name for emulator
@@ -120,32 +265,23 @@ def _get_device_name(device_id: str) -> str:
                 ['adb', '-s', device_id, 'emu', 'avd', 'name'],
                 capture_output=True, text=True, timeout=5
             )
-            if result.returncode == 0:
-                return result.stdout.strip()
-        else:
-            # Get model name for physical device
-            result = subprocess.run(
-                ['adb', '-s', device_id, 'shell', 'getprop', 'ro.product.model'],
-                capture_output=True, text=True, timeout=5
-            )
-            if result.returncode == 0:
-                return result.stdout.strip()
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+            if result.returncode == 0 and result.stdout.strip():
+                # Console replies "<avd name>\nOK"
+                name = result.stdout.strip().splitlines()[0]
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
         pass
-    return "Unknown"
+    
+    meta = {"name": name, "dimensions": dimensions}
+    if name != "Unknown" and dimensions:
+        _DEVICE_META[device_id] = meta
+    return meta
+
+
+def _get_device_name(device_id: str) -> str:
+    """Get device/emulator name"""
+    return _get_device_meta(device_id)["name"]
 
 
 def _get_device_dimensions(device_id: str) -> Optional[str]:
     """Get device screen dimensions"""
-    try:
-        result = subprocess.run(
-            ['adb', '-s', device_id, 'shell', 'wm', 'size'],
-            capture_output=True, text=True, timeout=5
-        )
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            if 'Physical size:' in output:
-                return output.split('Physical size:')[1].strip()
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, ValueError):
-        pass
-    return None
+    return _get_device_meta(device_id)["dimensions"]
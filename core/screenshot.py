@@ -3,27 +3,106 @@ Screenshot Capture and Annotation
 Handles screenshot capture and UI element visualization
 """
 import subprocess
+import functools
 import io
 import os
-import random
+import colorsys
+import hashlib
+import threading
+import dataclasses
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
 from PIL import Image, ImageDraw, ImageFont
 
-from .ui_elements import ElementNode, get_ui_elements
+from .device import with_device
+from .ui_elements import BoundingBox, ElementNode, get_ui_elements
+
+try:
+    import numpy as np
+    from numba import njit, prange
+except ImportError:  # Boxes are drawn with PIL
+    njit = None
+
+try:
+    import xxhash
+except ImportError:  # Falls back to blake2b
+    xxhash = None
 
 # Screenshots directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SCREENSHOTS_DIR = os.path.join(BASE_DIR, "ss")
 os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
 
+# Suffix for default filenames, so captures within one clock tick differ
+_SAVE_SEQ = itertools.count()
+
+# Runs hierarchy dumps alongside screencaps (independent device round-trips)
+_OBSERVE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="observe")
+
+BOX_WIDTH = 2
+
+# Recent annotated screenshots by content fingerprint. Full-resolution
+# images are large, so only a few are kept.
+ANNOTATE_CACHE_SIZE = 4
+_ANNOTATE_CACHE: "OrderedDict[bytes, Image.Image]" = OrderedDict()
+_ANNOTATE_LOCK = threading.Lock()
+
+# Fixed annotation palette: 32 saturated hues, ordered so neighbouring
+# indexes are far apart on the color wheel (11 is coprime with 32)
+PALETTE_SIZE = 32
+_PALETTE_RGB = [
+    tuple(round(c * 255) for c in colorsys.hsv_to_rgb((i * 11 % PALETTE_SIZE) / PALETTE_SIZE, 0.9, 0.9))
+    for i in range(PALETTE_SIZE)
+]
+_PALETTE = ["#{:02x}{:02x}{:02x}".format(*rgb) for rgb in _PALETTE_RGB]
+
 
-def capture_screenshot(device_id: Optional[str] = None) -> Image.Image:
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _draw_boxes(img, boxes, colors, width):
+        """
+        Draw rectangle outlines into an HxWxC uint8 image, boxes in parallel.
+        
+        Matches ImageDraw.rectangle(outline=..., width=width) for boxes at
+        least 2*width on each side: edges include (x2, y2) and grow inwards.
+        """
+        height, img_width = img.shape[0], img.shape[1]
+        for i in prange(boxes.shape[0]):
+            x1, y1, x2, y2 = boxes[i, 0], boxes[i, 1], boxes[i, 2], boxes[i, 3]
+            color = colors[i]
+            # Edges are placed on the full box and only clipped when
+            # written, so off-screen edges stay off-screen
+            cx1, cx2 = max(x1, 0), min(x2, img_width - 1)
+            for y in range(max(y1, 0), min(y2, height - 1) + 1):
+                if y < y1 + width or y > y2 - width:
+                    # Top/bottom edge rows
+                    for x in range(cx1, cx2 + 1):
+                        img[y, x] = color
+                else:
+                    for x in range(cx1, min(x1 + width - 1, cx2) + 1):
+                        img[y, x] = color
+                    for x in range(max(x2 - width + 1, cx1), cx2 + 1):
+                        img[y, x] = color
+
+
+def capture_screenshot(
+    device_id: Optional[str] = None,
+    max_dim: Optional[int] = None
+) -> Image.Image:
     """
     Capture a raw screenshot from the device.
     
+    Uses the cached uiautomator2 connection, which avoids spawning adb
+    and the PNG round-trip; falls back to `adb exec-out screencap`.
+    
     Args:
         device_id: Optional device ID to target
+        max_dim: Optional cap on the longer side. Larger screenshots are
+            downscaled, so pixel positions no longer match device
+            coordinates (see annotate_screenshot's scale)
         
     Returns:
         PIL Image object
@@ -32,90 +111,153 @@ def capture_screenshot(device_id: Optional[str] = None) -> Image.Image:
         RuntimeError: If screenshot capture fails
     """
     try:
-        cmd = ['adb']
-        if device_id:
-            cmd.extend(['-s', device_id])
-        cmd.extend(['exec-out', 'screencap', '-p'])
-        
-        result = subprocess.run(cmd, capture_output=True, check=True)
-        return Image.open(io.BytesIO(result.stdout))
-        
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to capture screenshot: {e}")
-    except FileNotFoundError:
-        raise RuntimeError("ADB not found. Ensure Android SDK is installed.")
+        image = with_device(device_id, lambda device: device.screenshot())
+    except Exception:
+        image = _capture_screenshot_adb(device_id)
+    
+    if max_dim and max(image.size) > max_dim:
+        image.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    return image
 
 
 def annotate_screenshot(
     screenshot: Image.Image, 
-    elements: list[ElementNode]
+    elements: list[ElementNode],
+    scale: float = 1.0
 ) -> Image.Image:
     """
     Annotate screenshot with UI element bounding boxes and labels.
     
+    The same pixels with the same elements (colors are deterministic)
+    reuse a recent result instead of redrawing.
+    
     Args:
         screenshot: PIL Image to annotate
         elements: List of ElementNode objects to draw
+        scale: Screenshot size relative to the device screen, for
+            screenshots captured with max_dim. Only the drawn boxes are
+            scaled; the elements keep device coordinates.
         
     Returns:
         Annotated PIL Image
     """
-    # Create a copy to avoid modifying original
-    annotated = screenshot.copy()
+    if scale != 1.0:
+        elements = _scale_elements(elements, scale)
+    key = _annotation_key(screenshot, elements)
+    with _ANNOTATE_LOCK:
+        cached = _ANNOTATE_CACHE.get(key)
+        if cached is not None:
+            _ANNOTATE_CACHE.move_to_end(key)
+    if cached is not None:
+        return cached.copy()
+    
+    annotated = _annotate(screenshot, elements)
+    
+    with _ANNOTATE_LOCK:
+        _ANNOTATE_CACHE[key] = annotated.copy()
+        if len(_ANNOTATE_CACHE) > ANNOTATE_CACHE_SIZE:
+            _ANNOTATE_CACHE.popitem(last=False)
+    return annotated
+
+
+def _annotate(screenshot: Image.Image, elements: list[ElementNode]) -> Image.Image:
+    colors = [_get_color(idx) for idx in range(len(elements))]
+    
+    if njit is not None and elements and screenshot.mode in ("RGB", "RGBA"):
+        # All outlines in one compiled pass over a copy of the pixels;
+        # PIL then only draws the labels
+        pixels = np.array(screenshot)
+        boxes = np.array(
+            [(e.bounding_box.x1, e.bounding_box.y1, e.bounding_box.x2, e.bounding_box.y2) for e in elements],
+            dtype=np.int64
+        )
+        rgba = np.array(
+            [_PALETTE_RGB[idx % PALETTE_SIZE] + (255,) for idx in range(len(elements))],
+            dtype=np.uint8
+        )
+        _draw_boxes(pixels, boxes, rgba[:, :pixels.shape[2]], BOX_WIDTH)
+        annotated = Image.fromarray(pixels, screenshot.mode)
+        boxes_drawn = True
+    else:
+        # Create a copy to avoid modifying original
+        annotated = screenshot.copy()
+        boxes_drawn = False
+    
     draw = ImageDraw.Draw(annotated)
     
     # Try to load a font
     font = _get_font(12)
     
     for idx, element in enumerate(elements):
-        color = _get_random_color()
-        _draw_element_annotation(draw, idx, element, color, font, annotated.width)
+        _draw_element_annotation(
+            draw, idx, element, colors[idx], font, annotated.width, draw_box=not boxes_drawn
+        )
     
     return annotated
 
 
 def capture_annotated_screenshot(
-    device_id: Optional[str] = None
+    device_id: Optional[str] = None,
+    max_dim: Optional[int] = None
 ) -> tuple[Image.Image, list[ElementNode]]:
     """
     Capture screenshot and annotate with UI elements.
     
+    The hierarchy dump runs on a worker thread while the screencap runs
+    here, so the call takes about as long as the slower of the two.
+    
     Args:
         device_id: Optional device ID to target
+        max_dim: Optional cap on the screenshot's longer side; boxes are
+            scaled to match, returned elements keep device coordinates
         
     Returns:
         Tuple of (annotated_image, list_of_elements)
     """
+    elements_future = _OBSERVE_POOL.submit(get_ui_elements, device_id)
     screenshot = capture_screenshot(device_id)
-    elements = get_ui_elements(device_id)
-    annotated = annotate_screenshot(screenshot, elements)
+    scale = 1.0
+    if max_dim and max(screenshot.size) > max_dim:
+        full_width = screenshot.width
+        screenshot.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        scale = screenshot.width / full_width
+    elements = elements_future.result()
+    annotated = annotate_screenshot(screenshot, elements, scale)
     return annotated, elements
 
 
 def save_screenshot(
     image: Image.Image, 
-    name: Optional[str] = None
+    name: Optional[str] = None,
+    image_format: str = "PNG"
 ) -> str:
     """
     Save screenshot to the screenshots directory.
     
+    Screenshots are short-lived artifacts, so they are encoded for speed:
+    PNG at zlib level 1, or JPEG at quality 85.
+    
     Args:
         image: PIL Image to save
         name: Optional filename (without extension)
+        image_format: "PNG" (default) or "JPEG"
         
     Returns:
         Full path to saved file
     """
-    import os
+    ext = ".jpg" if image_format.upper() == "JPEG" else ".png"
     
     if name:
-        filename = f"{name}.png" if not name.endswith('.png') else name
+        filename = f"{name}{ext}" if not name.endswith(ext) else name
     else:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"screenshot_{timestamp}.png"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        filename = f"screenshot_{timestamp}_{next(_SAVE_SEQ)}{ext}"
     
     filepath = os.path.join(SCREENSHOTS_DIR, filename)
-    image.save(filepath, 'PNG')
+    if ext == ".jpg":
+        image.convert("RGB").save(filepath, "JPEG", quality=85, optimize=False)
+    else:
+        image.save(filepath, "PNG", compress_level=1, optimize=False)
     return filepath
 
 
@@ -123,8 +265,38 @@ def save_screenshot(
 # Private Helper Functions
 # ============================================================
 
+def _scale_elements(elements: list[ElementNode], scale: float) -> list[ElementNode]:
+    """Copies of elements with bounding boxes in downscaled pixels."""
+    scaled = []
+    for element in elements:
+        box = element.bounding_box
+        scaled.append(dataclasses.replace(element, bounding_box=BoundingBox(
+            round(box.x1 * scale), round(box.y1 * scale),
+            round(box.x2 * scale), round(box.y2 * scale)
+        )))
+    return scaled
+
+
+def _capture_screenshot_adb(device_id: Optional[str] = None) -> Image.Image:
+    """Capture a screenshot with a one-off `adb exec-out screencap -p`."""
+    try:
+        cmd = ['adb']
+        if device_id:
+            cmd.extend(['-s', device_id])
+        cmd.extend(['exec-out', 'screencap', '-p'])
+        
+        result = subprocess.run(cmd, capture_output=True, check=True)
+        return Image.open(io.BytesIO(result.stdout))
+        
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to capture screenshot: {e}")
+    except FileNotFoundError:
+        raise RuntimeError("ADB not found. Ensure Android SDK is installed.")
+
+
+@functools.lru_cache(maxsize=8)
 def _get_font(size: int) -> ImageFont.FreeTypeFont:
-    """Try to load a font, fallback to default if unavailable"""
+    """Try to load a font, fallback to default if unavailable (memoized per size)"""
     font_paths = [
         'arial.ttf',
         '/System/Library/Fonts/Arial.ttf',
@@ -141,9 +313,20 @@ def _get_font(size: int) -> ImageFont.FreeTypeFont:
     return ImageFont.load_default()
 
 
-def _get_random_color() -> str:
-    """Generate a random hex color"""
-    return "#{:06x}".format(random.randint(0, 0xFFFFFF))
+def _annotation_key(screenshot: Image.Image, elements: list[ElementNode]) -> bytes:
+    """Fingerprint of the pixels plus every drawn element (name + box)."""
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    h.update(f"{screenshot.mode}|{screenshot.size}|".encode())
+    h.update(screenshot.tobytes())
+    for element in elements:
+        bbox = element.bounding_box
+        h.update(f"|{bbox.x1},{bbox.y1},{bbox.x2},{bbox.y2},{element.name}".encode())
+    return h.digest()
+
+
+def _get_color(index: int) -> str:
+    """Annotation color for the element at index (deterministic)"""
+    return _PALETTE[index % PALETTE_SIZE]
 
 
 def _draw_element_annotation(
@@ -152,17 +335,19 @@ def _draw_element_annotation(
     element: ElementNode,
     color: str,
     font: ImageFont.FreeTypeFont,
-    image_width: int
+    image_width: int,
+    draw_box: bool = True
 ) -> None:
-    """Draw bounding box and label for a single element"""
+    """Draw bounding box (unless already drawn) and label for a single element"""
     bbox = element.bounding_box
     
     # Draw bounding box
-    draw.rectangle(
-        [(bbox.x1, bbox.y1), (bbox.x2, bbox.y2)],
-        outline=color,
-        width=2
-    )
+    if draw_box:
+        draw.rectangle(
+            [(bbox.x1, bbox.y1), (bbox.x2, bbox.y2)],
+            outline=color,
+            width=BOX_WIDTH
+        )
     
     # Prepare label
     label_text = f"{index}: {element.name}"
@@ -0,0 +1,85 @@
+"""
+UI Hierarchy Cache
+Reuses parsed hierarchy dumps while the foreground activity is unchanged
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# (device_id, package, activity) entries kept
+UI_CACHE_SIZE = 4
+
+_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_LOCK = threading.Lock()
+_enabled = False
+_generation = 0  # bumped by invalidate_ui_cache()
+
+
+def enable_ui_cache(enabled: bool = True) -> None:
+    """
+    Turn the hierarchy cache on or off (off by default).
+    
+    While on, get_ui_elements() returns the last parse for the current
+    foreground activity instead of dumping the hierarchy again. Anything
+    that changes the screen must call invalidate_ui_cache(); the agent's
+    tool executors do so for every tool not in tools.READ_ONLY_TOOLS.
+    """
+    global _enabled
+    _enabled = enabled
+    if not enabled:
+        invalidate_ui_cache()
+
+
+def invalidate_ui_cache(device_id: Optional[str] = None) -> None:
+    """
+    Drop cached hierarchies.
+    
+    Args:
+        device_id: Device to forget. If None, clears every device.
+    """
+    global _generation
+    with _LOCK:
+        _generation += 1
+        if device_id is None:
+            _CACHE.clear()
+        else:
+            for key in [key for key in _CACHE if key[0] == device_id]:
+                del _CACHE[key]
+
+
+def cached_element_rows(
+    device,
+    device_id: Optional[str],
+    load: Callable[[], list[tuple]]
+) -> list[tuple]:
+    """
+    Element rows for the device's current activity, from the cache or load().
+    
+    Falls through to load() when the cache is off or the foreground app
+    can't be read.
+    """
+    if not _enabled:
+        return load()
+    
+    try:
+        current = device.app_current()
+        key = (device_id, current.get("package"), current.get("activity"))
+    except Exception:
+        return load()
+    
+    with _LOCK:
+        rows = _CACHE.get(key)
+        if rows is not None:
+            _CACHE.move_to_end(key)
+            return list(rows)
+        generation = _generation
+    
+    rows = load()
+    
+    with _LOCK:
+        # Skip the store if the screen was invalidated while dumping
+        if generation == _generation:
+            _CACHE[key] = tuple(rows)
+            if len(_CACHE) > UI_CACHE_SIZE:
+                _CACHE.popitem(last=False)
+    return rows
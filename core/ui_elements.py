@@ -5,12 +5,22 @@ Extracts interactive elements from Android UI hierarchy
 import re
 from dataclasses import dataclass
 from typing import Optional
-from xml.etree import ElementTree
 
-from .device import get_device_connection
+try:
+    from lxml.etree import XMLPullParser
+except ImportError:  # Falls back to the stdlib parser
+    from xml.etree.ElementTree import XMLPullParser
+
+try:
+    import numpy as np
+except ImportError:  # ElementBatch is unavailable
+    np = None
+
+from .device import get_device_lock, with_device
+from .ui_cache import cached_element_rows
 
 # Interactive element classes (common Android UI elements)
-INTERACTIVE_CLASSES = [
+INTERACTIVE_CLASSES: frozenset[str] = frozenset({
     "android.widget.Button",
     "android.widget.ImageButton",
     "android.widget.EditText",
@@ -31,7 +41,10 @@ INTERACTIVE_CLASSES = [
     "android.widget.HorizontalScrollView",
     "androidx.viewpager.widget.ViewPager",
     "androidx.viewpager2.widget.ViewPager2"
-]
+})
+
+# bounds="[x1,y1][x2,y2]"
+_BOUNDS_RE = re.compile(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]')
 
 
 @dataclass
@@ -94,6 +107,86 @@ class ElementNode:
         }
 
 
+# Hierarchy dumps are fed to the parser in pieces of this many characters
+FEED_CHUNK = 64 * 1024
+
+# ElementBatch.flags bits
+FLAG_CLICKABLE = 1
+FLAG_FOCUSABLE = 2
+
+
+@dataclass
+class ElementBatch:
+    """
+    Interactive elements of one screen as columns (needs numpy).
+    
+    bboxes is (N, 4) int32 x1, y1, x2, y2; centers is (N, 2) int32;
+    flags is (N,) uint8 of FLAG_CLICKABLE | FLAG_FOCUSABLE. Row i is the
+    same element as get_ui_elements()[i].
+    """
+    bboxes: "np.ndarray"
+    centers: "np.ndarray"
+    names: list[str]
+    class_names: list[str]
+    flags: "np.ndarray"
+    
+    @classmethod
+    def from_rows(cls, rows: list[tuple]) -> "ElementBatch":
+        """Build from _parse_element_rows() output."""
+        if np is None:
+            raise RuntimeError("ElementBatch requires numpy")
+        if not rows:
+            return cls(
+                bboxes=np.empty((0, 4), dtype=np.int32),
+                centers=np.empty((0, 2), dtype=np.int32),
+                names=[], class_names=[],
+                flags=np.empty(0, dtype=np.uint8)
+            )
+        # One transpose into columns; everything after it is whole-array
+        names, class_names, *coords, clickable, focusable = zip(*rows)
+        bboxes = np.array(coords, dtype=np.int32).T.copy()
+        flags = (
+            np.array(clickable, dtype=np.uint8) * FLAG_CLICKABLE
+            | np.array(focusable, dtype=np.uint8) * FLAG_FOCUSABLE
+        ).astype(np.uint8, copy=False)
+        return cls(
+            bboxes=bboxes,
+            centers=(bboxes[:, 0:2] + bboxes[:, 2:4]) >> 1,
+            names=list(names),
+            class_names=list(class_names),
+            flags=flags
+        )
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def element_at(self, x: int, y: int) -> Optional[int]:
+        """Index of the smallest element containing (x, y), or None."""
+        b = self.bboxes
+        hits = np.flatnonzero((b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3]))
+        if hits.size == 0:
+            return None
+        areas = (b[hits, 2] - b[hits, 0]) * (b[hits, 3] - b[hits, 1])
+        return int(hits[np.argmin(areas)])
+    
+    def to_element_nodes(self) -> list[ElementNode]:
+        """Rebuild ElementNode objects for callers that need them."""
+        return [
+            ElementNode(
+                name=name,
+                coordinates=CenterCord(x=int(cx), y=int(cy)),
+                bounding_box=BoundingBox(x1=int(x1), y1=int(y1), x2=int(x2), y2=int(y2)),
+                class_name=class_name,
+                clickable=bool(flags & FLAG_CLICKABLE),
+                focusable=bool(flags & FLAG_FOCUSABLE)
+            )
+            for name, class_name, (x1, y1, x2, y2), (cx, cy), flags in zip(
+                self.names, self.class_names, self.bboxes.tolist(),
+                self.centers.tolist(), self.flags.tolist()
+            )
+        ]
+
+
 def extract_coordinates(node) -> Optional[tuple[int, int, int, int]]:
     """
     Extract coordinates from Android UI hierarchy node bounds attribute.
@@ -108,7 +201,7 @@ def extract_coordinates(node) -> Optional[tuple[int, int, int, int]]:
     if not bounds:
         return None
         
-    match = re.search(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', bounds)
+    match = _BOUNDS_RE.match(bounds)
     if match:
         return tuple(map(int, match.groups()))
     return None
@@ -155,7 +248,7 @@ def get_element_name(node) -> str:
     return class_name.split('.')[-1]
 
 
-def is_interactive(node) -> bool:
+def is_interactive(node, _classes: frozenset[str] = INTERACTIVE_CLASSES) -> bool:
     """
     Check if a UI element is interactive.
     
@@ -164,11 +257,11 @@ def is_interactive(node) -> bool:
     - It's clickable OR
     - Its class is in the list of interactive classes
     """
-    attribs = node.attrib
+    get = node.attrib.get
     return (
-        attribs.get('focusable') == "true" or
-        attribs.get('clickable') == "true" or
-        attribs.get('class') in INTERACTIVE_CLASSES
+        get('focusable') == "true" or
+        get('clickable') == "true" or
+        get('class') in _classes
     )
 
 
@@ -185,43 +278,114 @@ def get_ui_elements(device_id: Optional[str] = None) -> list[ElementNode]:
     Raises:
         RuntimeError: If UI hierarchy cannot be retrieved
     """
-    try:
-        device = get_device_connection(device_id)
+    return [
+        ElementNode(
+            name=name,
+            coordinates=CenterCord(x=(x1 + x2) // 2, y=(y1 + y2) // 2),
+            bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2),
+            class_name=class_name,
+            clickable=clickable,
+            focusable=focusable
+        )
+        for name, class_name, x1, y1, x2, y2, clickable, focusable in _get_element_rows(device_id)
+    ]
+
+
+def get_ui_element_batch(device_id: Optional[str] = None) -> ElementBatch:
+    """
+    Get all interactive UI elements as an ElementBatch (columns, not objects).
+    
+    Args:
+        device_id: Optional device ID to target
         
-        # Get UI hierarchy XML
-        tree_string = device.dump_hierarchy()
-        element_tree = ElementTree.fromstring(tree_string)
+    Returns:
+        ElementBatch in the same order as get_ui_elements()
         
-        elements = []
-        # Find all visible and enabled nodes
-        nodes = element_tree.findall('.//*[@visible-to-user="true"][@enabled="true"]')
+    Raises:
+        RuntimeError: If UI hierarchy cannot be retrieved or numpy is missing
+    """
+    return ElementBatch.from_rows(_get_element_rows(device_id))
+
+
+def _get_element_rows(device_id: Optional[str]) -> list[tuple]:
+    def read(device) -> list[tuple]:
+        def load() -> list[tuple]:
+            # Get UI hierarchy XML (may run alongside a screencap, see
+            # capture_annotated_screenshot)
+            with get_device_lock(device_id):
+                tree_string = device.dump_hierarchy()
+            return _parse_element_rows(tree_string)
         
-        for node in nodes:
-            if not is_interactive(node):
-                continue
-                
-            coords = extract_coordinates(node)
-            if not coords:
-                continue
-                
-            name = get_element_name(node)
-            if not name:
-                continue
-                
-            x1, y1, x2, y2 = coords
-            center_x, center_y = get_center_coordinates(coords)
-            
-            element = ElementNode(
-                name=name,
-                coordinates=CenterCord(x=center_x, y=center_y),
-                bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2),
-                class_name=node.get('class', ''),
-                clickable=node.get('clickable') == 'true',
-                focusable=node.get('focusable') == 'true'
-            )
-            elements.append(element)
-            
-        return elements
+        return cached_element_rows(device, device_id, load)
+    
+    try:
+        return with_device(device_id, read)
         
     except Exception as e:
         raise RuntimeError(f"Failed to get UI elements: {e}")
+
+
+def _iter_parse_events(xml: str | bytes):
+    """
+    Feed the dump to a pull parser in FEED_CHUNK pieces, yielding
+    (event, node) as they complete. A str dump is encoded one chunk at a
+    time, so no second full-size copy of it is made.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    for i in range(0, len(xml), FEED_CHUNK):
+        chunk = xml[i:i + FEED_CHUNK]
+        parser.feed(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def _parse_element_rows(xml: str | bytes) -> list[tuple]:
+    """
+    Stream-parse a hierarchy dump into interactive element rows:
+    (name, class_name, x1, y1, x2, y2, clickable, focusable).
+    
+    Nodes are filtered on their start tag (attributes are known then) and
+    named on their end tag (children are parsed by then). A node's
+    children are dropped once it has been handled, so the full tree is
+    never held in memory. Results keep document order.
+    """
+    elements: list[Optional[tuple]] = []
+    slots: list[int] = []  # per open node: index into elements, or -1
+    # Locals for the per-node checks (module globals are dict lookups)
+    interactive_classes, bounds_match = INTERACTIVE_CLASSES, _BOUNDS_RE.match
+    
+    for event, node in _iter_parse_events(xml):
+        if event == "start":
+            get = node.attrib.get
+            if (
+                node.tag == "node"
+                and get('visible-to-user') == "true" and get('enabled') == "true"
+                and (
+                    get('clickable') == "true" or get('focusable') == "true"
+                    or get('class', '') in interactive_classes
+                )
+                and bounds_match(get('bounds') or '')
+            ):
+                slots.append(len(elements))
+                elements.append(None)
+            else:
+                slots.append(-1)
+            continue
+        
+        slot = slots.pop()
+        if slot >= 0:
+            name = get_element_name(node)
+            if name:
+                get = node.attrib.get
+                x1, y1, x2, y2 = map(int, bounds_match(get('bounds')).groups())
+                elements[slot] = (
+                    name, get('class', ''), x1, y1, x2, y2,
+                    get('clickable') == "true", get('focusable') == "true"
+                )
+        
+        # The parent only reads this node's own attributes (see
+        # get_element_name), so its subtree can go
+        del node[:]
+    
+    return [element for element in elements if element is not None]
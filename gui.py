@@ -5,9 +5,16 @@ Implements Planner-Navigator Architecture
 """
 import customtkinter as ctk
 from tkinter import messagebox
+import asyncio
+import copy
+import functools
 import threading
-import time
+import traceback
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
 from typing import Optional, Dict, Any, List
 from pathlib import Path
 from dotenv import load_dotenv
@@ -15,10 +22,17 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Full tracebacks for GUI errors only when GEMA_DEBUG is set
+DEBUG = os.getenv("GEMA_DEBUG", "").lower() in ("1", "true", "yes")
+
 # Cloud Agent imports
 from agent.brain import CloudAgent, Brain
 from agent.adapters import CLIProxyBrain
 from agent.planner import PlannerBrain
+from agent.middleware.plan_cache import PlanCache
+from agent.middleware.cache_manager import CacheManager
+from agent.middleware.caching_brain import CachingBrain
+from core import reset_device_cache
 
 # GUI imports
 from gui.styles import Colors, Fonts, Dimensions, Styles
@@ -28,12 +42,29 @@ from gui.components.agent_panel import AgentStatus
 from gui.components.plan_viewer import StepStatus
 from gui.settings import SettingsModal
 from gui.storage import ConfigStorage, HistoryStorage
-from tools import TOOL_REGISTRY
+from tools import READ_ONLY_TOOLS, TOOL_REGISTRY
+
+# Navigator instruction for one plan step (the whitespace-only line is
+# kept as-is so cached Navigator responses still match)
+NAV_PROMPT_TMPL = (
+    "Thực hiện bước sau: {action}\n"
+    "                    \n"
+    "Gợi ý tool: {tool}\n"
+    "\n"
+    "Hãy thực hiện CHÍNH XÁC hành động này, không làm gì khác."
+)
 
 
 class GemaCloudGUI(ctk.CTk):
     """Main Gema Cloud GUI Application with Planner-Navigator Architecture"""
     
+    # Worker-thread UI updates are coalesced into one Tk callback per frame
+    UI_PUMP_MS = 16
+    UI_PUMP_BATCH = 64
+    
+    # Chat history rows are written in batches this long after the first
+    HISTORY_FLUSH_MS = 500
+    
     def __init__(self):
         super().__init__()
         
@@ -47,6 +78,10 @@ class GemaCloudGUI(ctk.CTk):
         
         # Brains State (Planner-Navigator)
         self.planner: Optional[PlannerBrain] = None
+        self._plan_cache: Optional[PlanCache] = None  # shared across settings changes
+        self._provider_index = (None, {})  # (providers list, name -> provider)
+        self._nav_cache_manager: Optional[CacheManager] = None
+        self._agent_settings: Dict[str, tuple] = {}  # role -> _role_settings() at last build
         self.navigator: Optional[Brain] = None
         self.agent: Optional[CloudAgent] = None
         
@@ -55,17 +90,40 @@ class GemaCloudGUI(ctk.CTk):
         self._current_step_index: int = 0
         self._is_paused: bool = False
         self._is_executing: bool = False
+        self._current_future = None  # concurrent.futures.Future of the running plan
+        
+        # Screenshots are reused until a tool that can change the screen
+        # runs (bumps the token, see _on_tool_event)
+        self._take_screenshot = TOOL_REGISTRY["take_screenshot"]
+        self._screen_dirty_token: int = 0
+        self._last_screenshot = (None, -1)  # (filepath, token)
+        self._shown_screenshot: Optional[tuple] = None  # (path, mtime_ns, size) last sent to the workspace
+        # Captures run here, one at a time, so they can overlap other work
+        self._screenshot_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot")
+        
+        # Pending UI callbacks from worker threads (see _enqueue_ui)
+        self._ui_queue: deque = deque()
+        self._ui_pump_lock = threading.Lock()
+        self._ui_pump_scheduled = False
+        
+        # One long-lived event loop runs every plan (see _execute_plan)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="plan-loop", daemon=True).start()
         
         # Storage
         self.config_storage = ConfigStorage()
         self.history_storage = HistoryStorage()
         self._current_session_id = None
+        self._history_buffer: List[tuple] = []  # see _flush_history
+        self._history_flush_scheduled = False
         
         # Config - load from persistent storage
         self.config = self.config_storage.load()
         
         self._create_layout()
         self._init_agents()
+        
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
     
     def _create_layout(self):
         """Create Split View 70/30 layout like Nanobrowser"""
@@ -151,18 +209,37 @@ class GemaCloudGUI(ctk.CTk):
     
     def _init_agents(self):
         """Initialize Planner and Navigator brains"""
+        if self._init_planner():
+            self._init_navigator()
+    
+    def _role_settings(self, role: str) -> tuple:
+        """Snapshot of what a role's brain is built from: (role config, provider)"""
+        defaults = PLANNER_CONFIG if role == "planner" else NAVIGATOR_CONFIG
+        role_config = self.config.get(role, defaults)
+        provider = self._get_provider_by_name(self.config.get("providers", []), role_config.get("provider", ""))
+        return copy.deepcopy((role_config, provider))
+    
+    def _planner_plan_cache(self) -> Optional[PlanCache]:
+        """Shared plan cache if enabled in General settings (off by default)"""
+        # Repeated requests on the same screen (perceptual hash) reuse the
+        # stored plan instead of calling the Planner model
+        general_config = self.config.get("general", GENERAL_CONFIG)
+        if not general_config.get("plan_cache_enabled", GENERAL_CONFIG["plan_cache_enabled"]):
+            return None
+        if self._plan_cache is None:
+            self._plan_cache = PlanCache()
+        return self._plan_cache
+    
+    def _init_planner(self) -> bool:
+        """Initialize the Planner (high-capability model). Returns success."""
         try:
-            # Get providers from config
-            providers = self.config.get("providers", [])
-            
-            # 1. Initialize Planner (high-capability model)
             planner_config = self.config.get("planner", PLANNER_CONFIG)
             planner_model = planner_config.get("model", "gemini-2.5-pro")
             planner_provider_name = planner_config.get("provider", "")
             planner_prompt = planner_config.get("system_prompt")
             
             # Find provider details
-            planner_provider = self._get_provider_by_name(providers, planner_provider_name)
+            planner_provider = self._get_provider_by_name(self.config.get("providers", []), planner_provider_name)
             planner_api_key = planner_provider.get("api_key") if planner_provider else os.getenv("CLIPROXY_API_KEY", "gemaauto")
             planner_base_url = planner_provider.get("base_url", "http://localhost:8317/v1") if planner_provider else "http://localhost:8317/v1"
             
@@ -172,21 +249,35 @@ class GemaCloudGUI(ctk.CTk):
                     is_user=False
                 )
                 self.status_badge.configure(text="● No API Key", text_color=Colors.ACCENT_WARNING)
-                return
+                return False
             
+            if self.planner is not None:
+                # Its pooled async client belongs to the plan loop
+                asyncio.run_coroutine_threadsafe(self.planner.aclose(), self._loop)
             self.planner = PlannerBrain(
                 api_key=planner_api_key,
-                model_name=planner_model
+                model_name=planner_model,
+                plan_cache=self._planner_plan_cache()
             )
+            self._agent_settings["planner"] = self._role_settings("planner")
+            
+            print(f"🧠 Planner: {planner_model} ({planner_provider_name})")
+            return True
             
-            # 2. Initialize Navigator (fast model with tool callback)
+        except Exception as e:
+            self._report_init_error(e)
+            return False
+    
+    def _init_navigator(self) -> bool:
+        """Initialize the Navigator (fast model with tool callback). Returns success."""
+        try:
             nav_config = self.config.get("navigator", NAVIGATOR_CONFIG)
             nav_model = nav_config.get("model", "gemini-2.5-flash")
             nav_provider_name = nav_config.get("provider", "")
             nav_prompt = nav_config.get("system_prompt")  # Per-role system prompt
             
             # Find provider details
-            nav_provider = self._get_provider_by_name(providers, nav_provider_name)
+            nav_provider = self._get_provider_by_name(self.config.get("providers", []), nav_provider_name)
             nav_api_key = nav_provider.get("api_key") if nav_provider else os.getenv("CLIPROXY_API_KEY", "gemaauto")
             nav_base_url = nav_provider.get("base_url", "http://localhost:8317/v1") if nav_provider else "http://localhost:8317/v1"
             
@@ -198,53 +289,120 @@ class GemaCloudGUI(ctk.CTk):
                 system_prompt=nav_prompt  # Pass per-role prompt
             )
             
-            # Apply Caching Middleware to Navigator
-            from agent.middleware.cache_manager import CacheManager
-            from agent.middleware.caching_brain import CachingBrain
-            
-            cache_manager = CacheManager()
-            self.navigator = CachingBrain(self.navigator, cache_manager, user_id="default_user")
+            # Apply Caching Middleware to Navigator (the cache manager is
+            # shared across rebuilds so its entries stay warm)
+            if self._nav_cache_manager is None:
+                self._nav_cache_manager = CacheManager()
+            self.navigator = CachingBrain(self.navigator, self._nav_cache_manager, user_id="default_user")
             
             # Initialize Agent with Navigator
             self.agent = CloudAgent(self.navigator)
+            self._agent_settings["navigator"] = self._role_settings("navigator")
             
-            print(f"🧠 Planner: {planner_model} ({planner_provider_name})")
             print(f"🚀 Navigator: {nav_model} ({nav_provider_name})")
             
             self.status_badge.configure(text=f"● {nav_model}", text_color=Colors.ACCENT_SUCCESS)
+            return True
             
         except Exception as e:
-            import traceback
+            self._report_init_error(e)
+            return False
+    
+    def _report_init_error(self, e: Exception):
+        print(f"❌ Agent init failed: {e}")
+        if DEBUG:
             traceback.print_exc()
-            self.agent_panel.add_message(f"❌ Error: {e}", is_user=False)
-            self.status_badge.configure(text="● Error", text_color=Colors.ACCENT_ERROR)
+        self.agent_panel.add_message(f"❌ Error: {e}", is_user=False)
+        self.status_badge.configure(text="● Error", text_color=Colors.ACCENT_ERROR)
     
     def _get_provider_by_name(self, providers: List[Dict], name: str) -> Optional[Dict]:
         """Find a provider by name from the providers list."""
-        for p in providers:
-            if p.get("name") == name:
-                return p
-        return None
+        # Name -> provider index, rebuilt only when the list object changes
+        indexed, index = self._provider_index
+        if indexed is not providers:
+            index = {}
+            for p in providers:
+                index.setdefault(p.get("name"), p)  # first match wins
+            self._provider_index = (providers, index)
+        return index.get(name)
+    
+    def _enqueue_ui(self, fn):
+        """Queue fn to run on the main thread; one drain is scheduled per batch."""
+        self._ui_queue.append(fn)
+        with self._ui_pump_lock:
+            if self._ui_pump_scheduled:
+                return
+            self._ui_pump_scheduled = True
+        self.after(self.UI_PUMP_MS, self._drain_ui)
+    
+    def _drain_ui(self):
+        """Run queued UI callbacks (main thread), up to UI_PUMP_BATCH per pass."""
+        for _ in range(self.UI_PUMP_BATCH):
+            try:
+                fn = self._ui_queue.popleft()
+            except IndexError:
+                break
+            try:
+                fn()
+            except Exception as e:
+                print(f"UI update failed: {e}")
+        
+        with self._ui_pump_lock:
+            if not self._ui_queue:
+                self._ui_pump_scheduled = False
+                return
+        self.after(self.UI_PUMP_MS, self._drain_ui)
     
     def _on_tool_event(self, event: str, data: dict):
         """Handle tool execution events from Brain - update PlanViewer"""
         tool_name = data.get("name", "")
-        tool_args = data.get("args", {})
         
-        # Build description from tool name and args
-        args_str = ", ".join(f'{k}="{v}"' for k, v in list(tool_args.items())[:2])
-        description = f"{tool_name}({args_str})" if args_str else tool_name
+        if event in ("tool_done", "tool_failed") and tool_name not in READ_ONLY_TOOLS:
+            self._screen_dirty_token += 1
         
         if event == "tool_start":
+            # Build description from tool name and first two args (only
+            # tool_start shows it)
+            args_str = ", ".join(f'{k}="{v}"' for k, v in islice(data.get("args", {}).items(), 2))
+            description = f"{tool_name}({args_str})" if args_str else tool_name
+            
             # Add step and mark as running
-            from gui.components.plan_viewer import StepStatus
-            step_id = self.after(0, lambda: self._add_plan_step(description, tool_name))
+            self._enqueue_ui(lambda: self._add_plan_step(description, tool_name))
         elif event == "tool_done":
             # Mark last step as done
-            self.after(0, lambda: self._update_last_step_status("done"))
+            self._enqueue_ui(lambda: self._update_last_step_status("done"))
         elif event == "tool_failed":
             # Mark last step as failed
-            self.after(0, lambda: self._update_last_step_status("failed"))
+            self._enqueue_ui(lambda: self._update_last_step_status("failed"))
+    
+    async def _get_screenshot(self) -> Optional[str]:
+        """Screenshot path, reusing the last one while the screen is unchanged"""
+        token = self._screen_dirty_token
+        path, taken_at = self._last_screenshot
+        if path and taken_at == token:
+            return path
+        
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._screenshot_pool, self._take_screenshot)
+        except Exception as e:
+            print(f"Screenshot failed: {e}")
+            return None
+        path = result.get("filepath") if result.get("success") else None
+        if path:
+            self._last_screenshot = (path, token)
+        return path
+    
+    def _show_screenshot(self, path: str):
+        """Queue path for the workspace unless that exact file is already showing"""
+        try:
+            st = os.stat(path)
+            shown = (path, st.st_mtime_ns, st.st_size)
+        except OSError:
+            shown = None  # Let the workspace report it
+        if shown is not None and shown == self._shown_screenshot:
+            return
+        self._shown_screenshot = shown
+        self._enqueue_ui(lambda: self.workspace_panel.display_screenshot(path))
     
     def _add_plan_step(self, description: str, tool_name: str):
         """Add a step to the plan viewer (must be called from main thread)"""
@@ -267,14 +425,24 @@ class GemaCloudGUI(ctk.CTk):
             self.agent_panel.add_message("⚠️ Agent not initialized. Check Settings.", is_user=False)
             return
         
+        # One plan at a time on the plan loop
+        if self._current_future is not None and not self._current_future.done():
+            self.agent_panel.add_message("⚠️ A task is still running.", is_user=False)
+            return
+        
         # Create session if needed
         if not self._current_session_id:
             title = message[:50] + "..." if len(message) > 50 else message
             self._current_session_id = self.history_storage.create_session(title)
         
-        # Save to history
+        # Save to history (buffered, see _flush_history)
         file_paths = [str(f) for f in attached_files]
-        self.history_storage.add_message(self._current_session_id, "user", message, file_paths)
+        self._history_buffer.append(
+            (self._current_session_id, "user", message, file_paths, datetime.now().isoformat())
+        )
+        if not self._history_flush_scheduled:
+            self._history_flush_scheduled = True
+            self.after(self.HISTORY_FLUSH_MS, self._flush_history)
         
         # Display files info if any
         display_msg = message
@@ -293,142 +461,175 @@ class GemaCloudGUI(ctk.CTk):
         self.agent_panel.clear_plan()
         self.agent_panel._switch_tab("plan")
         
-        def execute_plan():
+        self._current_future = asyncio.run_coroutine_threadsafe(self._execute_plan(message), self._loop)
+    
+    async def _execute_plan(self, message: str):
+        """Plan, then navigate step by step (runs on the worker event loop)"""
+        loop = asyncio.get_running_loop()
+        # The device may have been used since the last plan
+        self._last_screenshot = (None, -1)
+        self._shown_screenshot = None
+        
+        try:
+            # ========================================
+            # PHASE 1: PLANNING
+            # ========================================
+            print("🧠 Phase 1: Planning...")
+            
+            # Take initial screenshot
+            screenshot_path = await self._get_screenshot()
+            if screenshot_path:
+                self._show_screenshot(screenshot_path)
+            
+            # Call Planner to generate plan
+            plan_result = await self.planner.create_plan_async(
+                user_request=message,
+                screenshot_path=screenshot_path
+            )
+            
+            if "error" in plan_result and plan_result["error"]:
+                self._enqueue_ui(lambda: self.agent_panel.add_message(
+                    f"⚠️ Planning failed: {plan_result.get('error', 'Unknown error')}", 
+                    is_user=False
+                ))
+                return
+            
+            # Extract steps from plan
+            steps = plan_result.get("steps", [])
+            goal = plan_result.get("goal", message)
+            
+            if not steps:
+                # Fallback to single-step if no plan generated
+                steps = [{"step": 1, "action": message, "reasoning": "Direct execution"}]
+            
+            # Display plan in PlanViewer; set once Tk has painted it
+            plan_rendered = asyncio.Event()
+            self._enqueue_ui(lambda: self._render_plan(
+                steps, on_rendered=lambda: self._loop.call_soon_threadsafe(plan_rendered.set)
+            ))
+            print(f"📋 Plan: {len(steps)} steps")
+            
+            # Store plan for execution
+            self._current_plan = steps
+            self._current_step_index = 0
+            
+            # Brief pause to show plan before execution (at most 0.5s)
             try:
-                # ========================================
-                # PHASE 1: PLANNING
-                # ========================================
-                print("🧠 Phase 1: Planning...")
-                
-                # Take initial screenshot
-                screenshot_path = None
-                try:
-                    result = TOOL_REGISTRY["take_screenshot"]()
-                    if result.get("success"):
-                        screenshot_path = result.get("filepath")
-                        if screenshot_path:
-                            self.after(0, lambda p=screenshot_path: self.workspace_panel.display_screenshot(p))
-                except Exception as e:
-                    print(f"Screenshot failed: {e}")
-                
-                # Call Planner to generate plan
-                plan_result = self.planner.create_plan(
-                    user_request=message,
-                    screenshot_path=screenshot_path
-                )
-                
-                if "error" in plan_result and plan_result["error"]:
-                    self.after(0, lambda: self.agent_panel.add_message(
-                        f"⚠️ Planning failed: {plan_result.get('error', 'Unknown error')}", 
-                        is_user=False
-                    ))
-                    return
-                
-                # Extract steps from plan
-                steps = plan_result.get("steps", [])
-                goal = plan_result.get("goal", message)
-                
-                if not steps:
-                    # Fallback to single-step if no plan generated
-                    steps = [{"step": 1, "action": message, "reasoning": "Direct execution"}]
-                
-                # Display plan in PlanViewer
-                self.after(0, lambda: self._render_plan(steps))
-                print(f"📋 Plan: {len(steps)} steps")
+                await asyncio.wait_for(plan_rendered.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+            
+            general_config = self.config.get("general", GENERAL_CONFIG)
+            inter_step_delay = general_config.get("inter_step_delay_ms", GENERAL_CONFIG["inter_step_delay_ms"]) / 1000
+            
+            # ========================================
+            # PHASE 2: NAVIGATION (Execute each step)
+            # ========================================
+            print("🚀 Phase 2: Navigating...")
+            self._enqueue_ui(lambda: self.agent_panel.set_status(AgentStatus.NAVIGATING))
+            
+            actions = [step.get("action", "") for step in steps]
+            prompts = [
+                NAV_PROMPT_TMPL.format(action=action, tool=step.get("tool_hint", ""))
+                for action, step in zip(actions, steps)
+            ]
+            
+            next_screenshot: Optional[asyncio.Future] = None  # prefetched, see below
+            
+            for idx, navigator_prompt in enumerate(prompts):
+                if self._is_paused:
+                    print("⏸️ Execution paused")
+                    break
                 
-                # Store plan for execution
-                self._current_plan = steps
-                self._current_step_index = 0
+                print(f"  Step {idx + 1}: {actions[idx]}")
                 
-                # Brief pause to show plan before execution
-                time.sleep(0.5)
+                # Mark step as running
+                self._enqueue_ui(lambda i=idx: self.agent_panel.plan_view.start_step(i))
                 
-                # ========================================
-                # PHASE 2: NAVIGATION (Execute each step)
-                # ========================================
-                print("🚀 Phase 2: Navigating...")
-                self.after(0, lambda: self.agent_panel.set_status(AgentStatus.NAVIGATING))
+                # Fresh screenshot before each step (reused if nothing changed;
+                # usually already captured during the previous step's pause)
+                path = await (next_screenshot or self._get_screenshot())
+                next_screenshot = None
+                if path:
+                    screenshot_path = path
+                    self._show_screenshot(path)
                 
-                for idx, step in enumerate(steps):
-                    if self._is_paused:
-                        print("⏸️ Execution paused")
-                        break
-                    
-                    step_action = step.get("action", "")
-                    step_tool = step.get("tool_hint", "")
-                    
-                    print(f"  Step {idx + 1}: {step_action}")
-                    
-                    # Mark step as running
-                    self.after(0, lambda i=idx: self.agent_panel.plan_view.start_step(i))
-                    
-                    # Take fresh screenshot before each step
-                    try:
-                        result = TOOL_REGISTRY["take_screenshot"]()
-                        if result.get("success"):
-                            screenshot_path = result.get("filepath")
-                            if screenshot_path:
-                                self.after(0, lambda p=screenshot_path: self.workspace_panel.display_screenshot(p))
-                    except Exception:
-                        pass
-                    
-                    # Navigate this step using the Navigator agent
-                    navigator_prompt = f"""Thực hiện bước sau: {step_action}
-                    
-Gợi ý tool: {step_tool}
-
-Hãy thực hiện CHÍNH XÁC hành động này, không làm gì khác."""
+                # Navigate this step using the Navigator agent
+                dirty_before = self._screen_dirty_token
+                try:
+                    response = await loop.run_in_executor(None, functools.partial(
+                        self.agent.chat,
+                        navigator_prompt,
+                        verbose=True,
+                        screenshot_path=screenshot_path
+                    ))
                     
-                    try:
-                        response = self.agent.chat(
-                            navigator_prompt,
-                            verbose=True,
-                            screenshot_path=screenshot_path
-                        )
-                        
-                        # Mark step as completed
-                        self.after(0, lambda i=idx: self.agent_panel.plan_view.complete_step(i))
-                        
-                    except Exception as step_error:
-                        print(f"  ❌ Step failed: {step_error}")
-                        self.after(0, lambda i=idx: self.agent_panel.plan_view.fail_step(i))
-                        break
+                    # Mark step as completed
+                    self._enqueue_ui(lambda i=idx: self.agent_panel.plan_view.complete_step(i))
                     
-                    # Brief pause between steps
-                    time.sleep(0.3)
+                except Exception as step_error:
+                    print(f"  ❌ Step failed: {step_error}")
+                    # The connection may be stale; the next run reconnects
+                    reset_device_cache()
+                    self._enqueue_ui(lambda i=idx: self.agent_panel.plan_view.fail_step(i))
+                    break
                 
-                # ========================================
-                # PHASE 3: COMPLETION
-                # ========================================
-                # Take final screenshot
-                try:
-                    result = TOOL_REGISTRY["take_screenshot"]()
-                    if result.get("success"):
-                        final_path = result.get("filepath")
-                        if final_path:
-                            self.after(0, lambda p=final_path: self.workspace_panel.display_screenshot(p))
-                except Exception:
-                    pass
-                
-                # Show completion message
-                self.after(0, lambda: self.agent_panel.add_message(
-                    f"✅ Completed: {goal}",
-                    is_user=False
-                ))
+                # Brief pause between steps, only if the screen changed
+                if self._screen_dirty_token != dirty_before and inter_step_delay:
+                    await asyncio.sleep(inter_step_delay)
                 
-            except Exception as ex:
-                import traceback
+                # Start capturing the next step's screen
+                next_screenshot = asyncio.ensure_future(self._get_screenshot())
+            
+            # ========================================
+            # PHASE 3: COMPLETION
+            # ========================================
+            # Take final screenshot
+            final_path = await (next_screenshot or self._get_screenshot())
+            if final_path:
+                self._show_screenshot(final_path)
+            
+            # Show completion message
+            self._enqueue_ui(lambda: self.agent_panel.add_message(
+                f"✅ Completed: {goal}",
+                is_user=False
+            ))
+            
+        except Exception as ex:
+            print(f"❌ Plan execution failed: {ex}")
+            reset_device_cache()
+            if DEBUG:
                 traceback.print_exc()
-                self.after(0, lambda e=str(ex): self.agent_panel.add_message(f"❌ Error: {e}", is_user=False))
-            finally:
-                self.after(0, lambda: self.agent_panel.set_processing(False))
-                self.after(0, lambda: self.agent_panel.set_status(AgentStatus.IDLE))
-        
-        threading.Thread(target=execute_plan, daemon=True).start()
+            self._enqueue_ui(lambda e=str(ex): self.agent_panel.add_message(f"❌ Error: {e}", is_user=False))
+        finally:
+            self._enqueue_ui(lambda: self.agent_panel.set_processing(False))
+            self._enqueue_ui(lambda: self.agent_panel.set_status(AgentStatus.IDLE))
+    
+    def _flush_history(self):
+        """Write buffered history messages in one transaction (main thread)"""
+        self._history_flush_scheduled = False
+        records, self._history_buffer = self._history_buffer, []
+        if not records:
+            return
+        try:
+            self.history_storage.add_messages_bulk(records)
+        except Exception as e:
+            print(f"⚠️ Failed to save chat history: {e}")
     
-    def _render_plan(self, steps: List[Dict]):
-        """Render the plan in PlanViewer"""
+    def _on_close(self):
+        """Save pending history, stop background workers, then close the window"""
+        self._flush_history()
+        if self._current_future is not None:
+            self._current_future.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._screenshot_pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+    
+    def _render_plan(self, steps: List[Dict], on_rendered=None):
+        """Render the plan in PlanViewer (on_rendered runs once Tk is idle)"""
         self.agent_panel.plan_view.render_plan(steps)
+        if on_rendered is not None:
+            self.after_idle(on_rendered)
     
     def _on_pause(self):
         """Handle pause button"""
@@ -442,6 +643,7 @@ Hãy thực hiện CHÍNH XÁC hành động này, không làm gì khác."""
     
     def _new_chat(self):
         """Start new chat"""
+        self._flush_history()
         if self.agent:
             self.agent.reset()
         self._current_plan = []
@@ -450,6 +652,7 @@ Hãy thực hiện CHÍNH XÁC hành động này, không làm gì khác."""
         self.agent_panel.clear_chat()
         self.agent_panel.clear_plan()
         self.workspace_panel.clear()
+        self._shown_screenshot = None
     
     def _show_settings(self):
         """Show settings modal"""
@@ -460,9 +663,18 @@ Hãy thực hiện CHÍNH XÁC hành động này, không làm gì khác."""
         )
     
     def _apply_settings(self, config: Dict[str, Any]):
-        """Apply saved settings"""
+        """Apply saved settings, rebuilding only brains whose settings changed"""
         self.config = config
-        self._init_agents()
+        
+        planner_changed = self._role_settings("planner") != self._agent_settings.get("planner")
+        navigator_changed = self._role_settings("navigator") != self._agent_settings.get("navigator")
+        
+        if planner_changed and not self._init_planner():
+            return
+        if not planner_changed and self.planner is not None:
+            self.planner.plan_cache = self._planner_plan_cache()
+        if navigator_changed:
+            self._init_navigator()
 
 
 def main():
@@ -3,6 +3,7 @@ Agent Panel Component
 Main interaction panel with Chat/Plan tabs and input area
 """
 import customtkinter as ctk
+from collections import deque
 from tkinter import filedialog
 from typing import Optional, Callable, Dict, Any, List
 from enum import Enum
@@ -29,6 +30,8 @@ class AgentPanel(ctk.CTkFrame):
         AgentStatus.NAVIGATING: ("🚀 Navigating...", Colors.STATUS_NAVIGATING),
     }
     
+    INPUT_HISTORY_SIZE = 100
+    
     def __init__(
         self, 
         parent,
@@ -42,6 +45,11 @@ class AgentPanel(ctk.CTkFrame):
         self._is_processing = False
         self._attached_files: List[Path] = []  # Files to attach with next message
         
+        # Sent tasks, recalled with Up/Down (repeating a task verbatim also
+        # lets the plan/response caches hit)
+        self._input_history: deque = deque(maxlen=self.INPUT_HISTORY_SIZE)
+        self._history_pos: Optional[int] = None
+        
         self._create_header()
         self._create_tabview()
         self._create_input_area()
@@ -139,6 +147,8 @@ class AgentPanel(ctk.CTkFrame):
         )
         self.input_entry.pack(side="left", fill="both", expand=True, padx=Dimensions.PAD_LG)
         self.input_entry.bind("<Return>", lambda e: self._handle_send())
+        self.input_entry.bind("<Up>", lambda e: self._recall_history(-1))
+        self.input_entry.bind("<Down>", lambda e: self._recall_history(1))
         
         # Attach button (file upload)
         self.attach_btn = ctk.CTkButton(
@@ -250,6 +260,9 @@ class AgentPanel(ctk.CTkFrame):
             return
         
         self.input_entry.delete(0, "end")
+        if message and (not self._input_history or self._input_history[-1] != message):
+            self._input_history.append(message)
+        self._history_pos = None
         attached = self._attached_files.copy()
         self._attached_files.clear()
         self._update_files_indicator()
@@ -257,6 +270,20 @@ class AgentPanel(ctk.CTkFrame):
         if self.on_send:
             self.on_send(message, attached)
     
+    def _recall_history(self, step: int):
+        """Replace the input with an older (-1) or newer (+1) sent task"""
+        if not self._input_history:
+            return "break"
+        
+        pos = len(self._input_history) if self._history_pos is None else self._history_pos
+        pos = max(0, min(pos + step, len(self._input_history)))
+        self._history_pos = None if pos == len(self._input_history) else pos
+        
+        self.input_entry.delete(0, "end")
+        if self._history_pos is not None:
+            self.input_entry.insert(0, self._input_history[pos])
+        return "break"
+    
     # ============================================================
     # Public API
     # ============================================================
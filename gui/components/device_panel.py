@@ -6,6 +6,7 @@ import customtkinter as ctk
 import threading
 from typing import List, Dict, Any, Callable
 
+from core import reset_device_cache
 from gui.styles import Colors, Fonts, Dimensions, Styles
 from tools import TOOL_REGISTRY
 
@@ -80,6 +81,8 @@ class DevicePanel(ctk.CTkFrame):
         
         def load():
             try:
+                # Devices may have been replugged; reconnect on next use
+                reset_device_cache()
                 result = TOOL_REGISTRY["list_emulators"]()
                 if result.get("success"):
                     devices = result.get("devices", [])
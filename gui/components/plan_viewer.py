@@ -43,6 +43,17 @@ class PlanStepItem(ctk.CTkFrame):
         self.grid_columnconfigure(1, weight=1)
         self._create_widgets(title, reasoning)
     
+    def reset(self, step_number: int, title: str, reasoning: str = ""):
+        """Reuse this widget for another step (as if newly created)"""
+        self.step_number = step_number
+        self._status = StepStatus.PENDING
+        
+        self.configure(border_color=Colors.BORDER)
+        self.badge.configure(text=str(step_number), fg_color=Colors.BG_HOVER)
+        self.status_icon.configure(text="")
+        self.title_label.configure(text_color=Colors.TEXT_PRIMARY)
+        self._set_content(title, reasoning)
+    
     def _create_widgets(self, title: str, reasoning: str):
         """Build step UI with badge, title, reasoning, and status icon"""
         
@@ -62,7 +73,7 @@ class PlanStepItem(ctk.CTkFrame):
         # 2. Main Title (Action)
         self.title_label = ctk.CTkLabel(
             self,
-            text=title,
+            text="",
             font=(Fonts.FAMILY, Fonts.SIZE_BASE, "bold"),
             text_color=Colors.TEXT_PRIMARY,
             anchor="w",
@@ -70,21 +81,18 @@ class PlanStepItem(ctk.CTkFrame):
         )
         self.title_label.grid(row=0, column=1, sticky="ew", padx=(0, Dimensions.PAD_MD), pady=(Dimensions.PAD_MD, 0))
         
-        # 3. Reasoning (Why this step?)
-        if reasoning:
-            self.reasoning_label = ctk.CTkLabel(
-                self,
-                text=f"💡 {reasoning}",
-                font=(Fonts.FAMILY, Fonts.SIZE_SM, "italic"),
-                text_color=Colors.TEXT_SECONDARY,
-                anchor="w",
-                justify="left",
-                wraplength=280
-            )
-            self.reasoning_label.grid(row=1, column=1, sticky="ew", padx=(0, Dimensions.PAD_MD), pady=(2, Dimensions.PAD_MD))
-        else:
-            # Add padding if no reasoning
-            self.title_label.grid_configure(pady=Dimensions.PAD_MD)
+        # 3. Reasoning (Why this step?) - hidden by _set_content when empty
+        self.reasoning_label = ctk.CTkLabel(
+            self,
+            text="",
+            font=(Fonts.FAMILY, Fonts.SIZE_SM, "italic"),
+            text_color=Colors.TEXT_SECONDARY,
+            anchor="w",
+            justify="left",
+            wraplength=280
+        )
+        self.reasoning_label.grid(row=1, column=1, sticky="ew", padx=(0, Dimensions.PAD_MD), pady=(2, Dimensions.PAD_MD))
+        self._set_content(title, reasoning)
         
         # 4. Status Icon (Right side)
         self.status_icon = ctk.CTkLabel(
@@ -95,6 +103,18 @@ class PlanStepItem(ctk.CTkFrame):
         )
         self.status_icon.grid(row=0, column=2, rowspan=2, padx=Dimensions.PAD_MD, pady=Dimensions.PAD_MD)
     
+    def _set_content(self, title: str, reasoning: str):
+        """Set title and reasoning text"""
+        self.title_label.configure(text=title)
+        if reasoning:
+            self.reasoning_label.configure(text=f"💡 {reasoning}")
+            self.reasoning_label.grid()
+            self.title_label.grid_configure(pady=(Dimensions.PAD_MD, 0))
+        else:
+            # Add padding if no reasoning
+            self.reasoning_label.grid_remove()
+            self.title_label.grid_configure(pady=Dimensions.PAD_MD)
+    
     def set_status(self, status: StepStatus):
         """Update visual status of step"""
         self._status = status
@@ -130,6 +150,9 @@ class PlanViewer(ctk.CTkFrame):
     Shows high-level goals from Planner, not low-level Navigator actions.
     """
     
+    # Cleared step widgets kept hidden for reuse instead of destroyed
+    MAX_POOLED_STEPS = 50
+    
     def __init__(
         self, 
         master,
@@ -147,6 +170,7 @@ class PlanViewer(ctk.CTkFrame):
         self.on_pause = on_pause
         self.on_resume = on_resume
         self._steps: List[PlanStepItem] = []
+        self._step_pool: List[PlanStepItem] = []
         self._current_step_index = -1
         self._is_paused = False
         
@@ -243,14 +267,11 @@ class PlanViewer(ctk.CTkFrame):
         
         # Create step widgets
         for item in plan_json:
-            step_widget = PlanStepItem(
-                self.scroll_frame,
+            self._acquire_step(
                 step_number=item.get("step", len(self._steps) + 1),
                 title=item.get("action", ""),
                 reasoning=item.get("reasoning", "")
             )
-            step_widget.pack(fill="x", pady=Dimensions.PAD_XS)
-            self._steps.append(step_widget)
         
         # Update header
         self.steps_count.configure(text=f"{len(self._steps)} steps")
@@ -310,10 +331,30 @@ class PlanViewer(ctk.CTkFrame):
             if self.on_resume:
                 self.on_resume()
     
+    def _acquire_step(self, step_number: int, title: str, reasoning: str = "") -> PlanStepItem:
+        """Show a step widget, reusing a pooled one when available"""
+        if self._step_pool:
+            step_widget = self._step_pool.pop()
+            step_widget.reset(step_number, title, reasoning)
+        else:
+            step_widget = PlanStepItem(
+                self.scroll_frame,
+                step_number=step_number,
+                title=title,
+                reasoning=reasoning
+            )
+        step_widget.pack(fill="x", pady=Dimensions.PAD_XS)
+        self._steps.append(step_widget)
+        return step_widget
+    
     def clear(self):
-        """Clear all steps"""
+        """Clear all steps (widgets are hidden and pooled for the next plan)"""
         for step in self._steps:
-            step.destroy()
+            if len(self._step_pool) < self.MAX_POOLED_STEPS:
+                step.pack_forget()
+                self._step_pool.append(step)
+            else:
+                step.destroy()
         self._steps.clear()
         self._current_step_index = -1
         self._is_paused = False
@@ -334,15 +375,8 @@ class PlanViewer(ctk.CTkFrame):
         self.empty_label.pack_forget()
         
         step_number = len(self._steps) + 1
-        step_widget = PlanStepItem(
-            self.scroll_frame,
-            step_number=step_number,
-            title=description,
-            reasoning=tool_name if tool_name else ""
-        )
+        step_widget = self._acquire_step(step_number, description, tool_name if tool_name else "")
         step_widget.set_status(status)
-        step_widget.pack(fill="x", pady=Dimensions.PAD_XS)
-        self._steps.append(step_widget)
         
         self.steps_count.configure(text=f"{len(self._steps)} steps")
         self.controls_frame.pack(fill="x", side="bottom")
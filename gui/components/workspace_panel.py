@@ -22,6 +22,8 @@ class WorkspacePanel(ctk.CTkFrame):
         )
         
         self._current_image_path: Optional[str] = None
+        # (path, mtime_ns, size) of the image on screen, None otherwise
+        self._displayed: Optional[tuple] = None
         self._create_layout()
     
     def _create_layout(self):
@@ -88,17 +90,29 @@ class WorkspacePanel(ctk.CTkFrame):
             text_color=Colors.TEXT_DISABLED
         ).pack(pady=Dimensions.PAD_XS)
     
-    def display_screenshot(self, image_path: str):
-        """Display a screenshot from file path"""
+    def display_screenshot(self, image_path: str, force: bool = False):
+        """
+        Display a screenshot from file path.
+        
+        The same unchanged file is not decoded again unless force is set
+        (e.g. to refit it after a resize).
+        """
         # Convert to absolute path if relative
         if not os.path.isabs(image_path):
             image_path = os.path.join(os.getcwd(), image_path)
         
-        if not os.path.exists(image_path):
+        try:
+            st = os.stat(image_path)
+        except OSError:
             print(f"Screenshot not found: {image_path}")
             return
         
+        displayed = (image_path, st.st_mtime_ns, st.st_size)
+        if not force and displayed == self._displayed:
+            return
+        
         self._current_image_path = image_path
+        self._displayed = None
         
         # Clear content
         for widget in self.content_frame.winfo_children():
@@ -142,6 +156,7 @@ class WorkspacePanel(ctk.CTkFrame):
             
             # Keep reference to prevent garbage collection
             img_label.image = ctk_image
+            self._displayed = displayed
             
         except Exception as e:
             print(f"Error loading image: {e}")
@@ -149,6 +164,7 @@ class WorkspacePanel(ctk.CTkFrame):
     
     def _show_error(self, message: str):
         """Show error message"""
+        self._displayed = None
         for widget in self.content_frame.winfo_children():
             widget.destroy()
         
@@ -180,10 +196,11 @@ class WorkspacePanel(ctk.CTkFrame):
     def _on_refresh(self):
         """Refresh current screenshot"""
         if self._current_image_path:
-            self.display_screenshot(self._current_image_path)
+            self.display_screenshot(self._current_image_path, force=True)
     
     def display_text(self, title: str, content: str):
         """Display text content (for logs, XML, etc.)"""
+        self._displayed = None
         for widget in self.content_frame.winfo_children():
             widget.destroy()
         
@@ -202,4 +219,5 @@ class WorkspacePanel(ctk.CTkFrame):
     def clear(self):
         """Clear and show placeholder"""
         self._current_image_path = None
+        self._displayed = None
         self._show_placeholder()
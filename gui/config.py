@@ -23,7 +23,9 @@ GENERAL_CONFIG = {
     "vision_enabled": True,
     "highlight_actions": True,
     "app_wait_time_ms": 2000,
-    "replanning_frequency": 3
+    "replanning_frequency": 3,
+    "inter_step_delay_ms": 150,  # Only after steps that changed the screen
+    "plan_cache_enabled": False  # Replay stored plans for repeated requests
 }
 
 # Available model options per provider
@@ -239,6 +239,30 @@ class GeneralTab(ctk.CTkScrollableFrame):
             max_val=5000
         )
         self._settings["app_wait_time_ms"].pack(fill="x", pady=Dimensions.PAD_MD)
+        
+        self._add_divider(settings_frame)
+        
+        # Inter-step Delay
+        self._settings["inter_step_delay_ms"] = NumberSetting(
+            settings_frame,
+            label="Inter-step Delay",
+            description="Pause after a step that changed the screen (0-2000ms)",
+            value=self.config.get("inter_step_delay_ms", 150),
+            min_val=0,
+            max_val=2000
+        )
+        self._settings["inter_step_delay_ms"].pack(fill="x", pady=Dimensions.PAD_MD)
+        
+        self._add_divider(settings_frame)
+        
+        # Plan Cache
+        self._settings["plan_cache_enabled"] = ToggleSetting(
+            settings_frame,
+            label="Reuse Plans",
+            description="Replay a stored plan when the same request is made on the same screen",
+            value=self.config.get("plan_cache_enabled", False)
+        )
+        self._settings["plan_cache_enabled"].pack(fill="x", pady=Dimensions.PAD_MD)
     
     def _add_divider(self, parent):
         """Add a horizontal divider"""
@@ -258,6 +282,8 @@ class GeneralTab(ctk.CTkScrollableFrame):
             "highlight_actions": self._settings["highlight_actions"].get_value(),
             "replanning_frequency": self._settings["replanning_frequency"].get_value(),
             "app_wait_time_ms": self._settings["app_wait_time_ms"].get_value(),
+            "inter_step_delay_ms": self._settings["inter_step_delay_ms"].get_value(),
+            "plan_cache_enabled": self._settings["plan_cache_enabled"].get_value(),
         }
     
     def set_values(self, config: Dict[str, Any]):
@@ -289,7 +289,7 @@ class RoleConfigCard(ctk.CTkFrame):
         
         self.role_name = role_name
         self.config = config.copy()
-        self.providers = providers
+        self._set_providers(providers)
         self.default_prompt = default_prompt
         self._prompt_expanded = False
         
@@ -383,12 +383,17 @@ class RoleConfigCard(ctk.CTkFrame):
         # Bottom padding
         ctk.CTkFrame(self, fg_color="transparent", height=Dimensions.PAD_SM).pack()
     
+    def _set_providers(self, providers: List[Dict[str, Any]]):
+        """Store providers and index their model lists by provider name."""
+        self.providers = providers
+        self._models_by_provider: Dict[str, List[str]] = {}
+        for p in providers:
+            # First entry wins, as with the previous linear lookup
+            self._models_by_provider.setdefault(p.get("name"), p.get("models", []))
+    
     def _get_models_for_provider(self, provider_name: str) -> List[str]:
         """Get models for a specific provider."""
-        for p in self.providers:
-            if p.get("name") == provider_name:
-                return p.get("models", [])
-        return []
+        return self._models_by_provider.get(provider_name, [])
     
     def _on_provider_change(self, new_provider: str):
         """Handle provider change - update model dropdown."""
@@ -467,7 +472,7 @@ class RoleConfigCard(ctk.CTkFrame):
     
     def update_providers(self, providers: List[Dict[str, Any]]):
         """Update available providers."""
-        self.providers = providers
+        self._set_providers(providers)
         provider_names = [p["name"] for p in providers if p.get("name")]
         if provider_names:
             self.provider_dropdown.configure(values=provider_names)
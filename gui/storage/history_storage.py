@@ -139,6 +139,42 @@ class HistoryStorage:
         
         return message_id
     
+    def add_messages_bulk(self, records: List[tuple]) -> List[str]:
+        """
+        Add several messages in one transaction.
+        
+        Args:
+            records: (session_id, role, content, files, timestamp) tuples;
+                timestamp may be None for "now"
+        
+        Returns:
+            The new message ids, in order
+        """
+        if not records:
+            return []
+        
+        now = datetime.now().isoformat()
+        rows = [
+            (str(uuid.uuid4()), session_id, role, content, json.dumps(files or []), timestamp or now)
+            for session_id, role, content, files, timestamp in records
+        ]
+        updated = {}
+        for row in rows:
+            updated[row[1]] = max(updated.get(row[1], row[5]), row[5])
+        
+        with sqlite3.connect(self.DB_FILE) as conn:
+            conn.executemany(
+                'INSERT INTO messages (id, session_id, role, content, files, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.executemany(
+                'UPDATE sessions SET updated_at = ? WHERE id = ?',
+                [(timestamp, session_id) for session_id, timestamp in updated.items()]
+            )
+            conn.commit()
+        
+        return [row[0] for row in rows]
+    
     def get_sessions(self, limit: int = 50) -> List[Session]:
         """Get all sessions, ordered by most recent."""
         with sqlite3.connect(self.DB_FILE) as conn:
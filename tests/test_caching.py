@@ -56,6 +56,12 @@ def test_v3_key_generator():
     assert scope == "contextual"
     print(f"✅ Personal query -> {scope} (conf={conf:.1f})")
     
+    # Plural and longer forms of personal indicators stay personal
+    for query in ("show favorites", "open accounts page", "list profiles", "read myself"):
+        scope, conf = gen.detect_scope(query, [])
+        assert scope == "contextual", f"{query!r}: expected contextual, got {scope}"
+    print("✅ Plural/longer personal forms -> contextual")
+    
     # Blacklisted
     scope, conf = gen.detect_scope("Mấy giờ rồi?", [])
     assert scope == "blacklisted"
@@ -120,6 +126,7 @@ def test_v3_caching_brain():
     print(f"📊 Entries: {stats['entries']}, Size: {stats['size_mb']:.3f} MB")
     
     # Cleanup
+    cache_manager.close()
     if os.path.exists(db_file):
         try:
             os.remove(db_file)
@@ -129,6 +136,35 @@ def test_v3_caching_brain():
     print("\n🎉 All V3 tests passed!")
 
 
+def test_prune_keeps_recently_read():
+    print("\n=== Test Last-Access Pruning ===")
+    
+    db_file = f"test_cache_prune_{int(time.time())}.db"
+    cache_manager = CacheManager(db_path=db_file, maintenance=False)
+    
+    for key in ("old_read", "old_unread", "new"):
+        cache_manager.set(key, ThinkResult(action="final_answer", content=key))
+        time.sleep(0.01)
+    
+    # Reading the oldest entry makes it the most recently used
+    assert set(cache_manager.get_many(["old_read", "missing"])) == {"old_read"}
+    
+    cache_manager.prune_to_limit(2)
+    assert cache_manager.count() == 2
+    assert cache_manager.get("old_read") is not None
+    assert cache_manager.get("old_unread") is None
+    assert cache_manager.get("new") is not None
+    print("✅ Least recently read entry evicted, recently read kept")
+    
+    cache_manager.close()
+    if os.path.exists(db_file):
+        try:
+            os.remove(db_file)
+        except:
+            pass
+
+
 if __name__ == "__main__":
     test_v3_key_generator()
     test_v3_caching_brain()
+    test_prune_keeps_recently_read()
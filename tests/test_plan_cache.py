@@ -0,0 +1,65 @@
+"""
+Test Plan Cache - request keys and perceptual-hash matching
+"""
+import sys
+import os
+import time
+
+sys.path.append(os.getcwd())
+
+from agent.middleware import plan_cache
+from agent.middleware.plan_cache import PlanCache, normalize_request
+
+
+# Fake screenshots: path -> 64-bit screen hash
+SCREENS = {
+    "home.png": 0x0F0F0F0F0F0F0F0F,
+    "home_near.png": 0x0F0F0F0F0F0F0F0F ^ 0b111,  # 3 bits away
+    "other.png": 0xF0F0F0F0F0F0F0F0,  # 64 bits away
+}
+
+
+def test_plan_cache_hamming():
+    print("\n=== Test PlanCache ===")
+    
+    db_file = f"test_plan_cache_{int(time.time())}.db"
+    print(f"📂 Using DB: {db_file}")
+    
+    original_screen_hash = plan_cache.screen_hash
+    plan_cache.screen_hash = SCREENS.get
+    cache = PlanCache(db_path=db_file, max_distance=6)
+    try:
+        plan = {"steps": [{"action": "Open Settings"}]}
+        cache.set("Mở Cài đặt", plan, "home.png")
+        
+        print("\n--- Test: Hamming Distance ---")
+        assert cache.get("Mở Cài đặt", "home.png") == plan
+        assert cache.get("mở cài đặt!", "home_near.png") == plan
+        print("✅ Same request within max_distance -> HIT")
+        
+        assert cache.get("Mở Cài đặt", "other.png") is None
+        print("✅ Different screen -> MISS")
+        
+        assert cache.get("Mở Cài đặt") is None
+        print("✅ No screenshot -> MISS (only text-only plans match)")
+        
+        print("\n--- Test: Request Key ---")
+        assert normalize_request("bán") != normalize_request("bàn") != normalize_request("bạn")
+        assert cache.get("Mo Cai dat", "home.png") is None
+        print("✅ Diacritics kept in the request key")
+        
+        cache.set("Bad plan", {"error": "parse failed"}, "home.png")
+        assert cache.get("Bad plan", "home.png") is None
+        print("✅ Failed plans are not stored")
+    finally:
+        plan_cache.screen_hash = original_screen_hash
+        cache.close()
+        if os.path.exists(db_file):
+            try:
+                os.remove(db_file)
+            except:
+                pass
+
+
+if __name__ == "__main__":
+    test_plan_cache_hamming()
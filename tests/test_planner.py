@@ -0,0 +1,32 @@
+"""
+Test Planner HTTP clients
+"""
+import sys
+import os
+import asyncio
+
+sys.path.append(os.getcwd())
+
+from agent.planner import PlannerBrain
+
+
+def test_async_client_headers():
+    print("\n=== Test Planner Async Client ===")
+    
+    planner = PlannerBrain(api_key="test-key", model_name="mock-model")
+    
+    async def build():
+        client = planner._get_async_client()
+        headers = {k.lower(): v for k, v in client.headers.items()}
+        await planner.aclose()
+        return headers
+    
+    headers = asyncio.run(build())
+    assert headers["authorization"] == "Bearer test-key"
+    assert headers["content-type"] == "application/json"
+    assert "python-requests" not in headers.get("user-agent", "")
+    print("✅ Only the planner's own headers, not the requests Session defaults")
+
+
+if __name__ == "__main__":
+    test_async_client_headers()
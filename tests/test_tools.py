@@ -0,0 +1,25 @@
+"""
+Test Tool Registry lookup
+"""
+import sys
+import os
+
+sys.path.append(os.getcwd())
+
+from tools import TOOL_ENTRIES, resolve_tool
+
+
+def test_resolve_tool():
+    print("\n=== Test resolve_tool ===")
+    
+    assert resolve_tool("press_back") is TOOL_ENTRIES["press_back"]
+    assert resolve_tool("Press-Back") is TOOL_ENTRIES["press_back"]
+    print("✅ Case/separator typos resolve to the tool")
+    
+    assert resolve_tool("no_such_tool") is None
+    assert resolve_tool("") is None
+    print("✅ Unknown name -> None")
+
+
+if __name__ == "__main__":
+    test_resolve_tool()
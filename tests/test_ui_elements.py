@@ -0,0 +1,147 @@
+"""
+Test UI Element Parsing - streaming parser vs. the ElementTree baseline
+"""
+import sys
+import os
+from xml.etree import ElementTree
+
+sys.path.append(os.getcwd())
+
+from core import device as device_module
+from core import ui_elements
+from core.ui_elements import (
+    BoundingBox, CenterCord, ElementNode, ElementBatch,
+    get_ui_elements, get_element_name, is_interactive,
+    extract_coordinates, get_center_coordinates, _parse_element_rows
+)
+
+
+def node(attrs: str, children: str = "") -> str:
+    defaults = {"visible-to-user": "true", "enabled": "true", "class": "android.view.View"}
+    for part in attrs.split(" "):
+        if part:
+            key, _, value = part.partition("=")
+            defaults[key] = value.strip('"')
+    attributes = " ".join(f'{key}="{value}"' for key, value in defaults.items())
+    return f"<node {attributes}>{children}</node>" if children else f"<node {attributes} />"
+
+
+TEXT = "android.widget.TextView"
+
+HIERARCHY = "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">" + node(
+    'class=android.widget.FrameLayout bounds=[0,0][1080,2400]',
+    # Named from its child TextViews (text, then content-desc)
+    node('class=android.widget.Button clickable=true bounds=[10,20][210,120]',
+         node(f'class={TEXT} text=OK bounds=[20,30][60,50]')
+         + node(f'class={TEXT} content-desc=Confirm bounds=[70,30][200,50]'))
+    # Grandchild TextViews don't name it; content-desc does
+    + node('class=android.widget.LinearLayout clickable=true content-desc=Row bounds=[0,200][1080,400]',
+           node('class=android.widget.FrameLayout bounds=[0,200][500,400]',
+                node(f'class={TEXT} text=Nested bounds=[0,200][500,300]'))
+           # Nested interactive node comes after its parent
+           + node('class=android.widget.CheckBox bounds=[900,250][1000,350]'))
+    # Interactive by class only, named by its own text
+    + node('class=android.widget.EditText text=Search bounds=[0,500][1080,600]')
+    # Focusable only, falls back to the short class name
+    + node('class=android.widget.ImageView focusable=true bounds=[0,700][100,800]')
+    # Filtered out: hidden, disabled, not interactive, bad or missing bounds, empty name
+    + node('class=android.widget.Button clickable=true visible-to-user=false text=Hidden bounds=[0,0][10,10]')
+    + node('class=android.widget.Button clickable=true enabled=false text=Disabled bounds=[0,0][10,10]')
+    + node(f'class={TEXT} text=Label bounds=[0,900][100,950]')
+    + node('class=android.widget.Button clickable=true text=Bad bounds=[0,0][abc]')
+    + node('class=android.widget.Button clickable=true text=NoBounds')
+    + node('class= clickable=true bounds=[0,0][10,10]')
+    + node('class=android.widget.Switch text=Wifi bounds=[0,1000][200,1100]')
+) + "</hierarchy>"
+
+
+def baseline_elements(xml: str) -> list[ElementNode]:
+    """The original ElementTree.fromstring + findall implementation."""
+    elements = []
+    for n in ElementTree.fromstring(xml).findall('.//*[@visible-to-user="true"][@enabled="true"]'):
+        if not is_interactive(n):
+            continue
+        coords = extract_coordinates(n)
+        if not coords:
+            continue
+        name = get_element_name(n)
+        if not name:
+            continue
+        x1, y1, x2, y2 = coords
+        center_x, center_y = get_center_coordinates(coords)
+        elements.append(ElementNode(
+            name=name,
+            coordinates=CenterCord(x=center_x, y=center_y),
+            bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2),
+            class_name=n.get('class', ''),
+            clickable=n.get('clickable') == 'true',
+            focusable=n.get('focusable') == 'true'
+        ))
+    return elements
+
+
+class FakeDevice:
+    def dump_hierarchy(self):
+        return HIERARCHY
+
+
+def test_parse_matches_baseline():
+    print("\n=== Test UI Element Parsing ===")
+    
+    expected = baseline_elements(HIERARCHY)
+    assert [e.name for e in expected] == [
+        "OK Confirm", "Row", "CheckBox", "Search", "ImageView", "Wifi"
+    ]
+    
+    # get_ui_elements end to end, on a cached fake connection
+    device_module._DEVICE_CACHE["test-device"] = FakeDevice()
+    try:
+        assert get_ui_elements("test-device") == expected
+    finally:
+        device_module.reset_device_cache("test-device")
+    print("✅ get_ui_elements matches the ElementTree baseline")
+    
+    # Chunk boundaries inside tags and attributes, str and bytes input
+    original_chunk = ui_elements.FEED_CHUNK
+    ui_elements.FEED_CHUNK = 7
+    try:
+        rows = _parse_element_rows(HIERARCHY)
+        assert rows == _parse_element_rows(HIERARCHY.encode("utf-8"))
+    finally:
+        ui_elements.FEED_CHUNK = original_chunk
+    assert rows == _parse_element_rows(HIERARCHY)
+    print("✅ Same rows for any feed chunk size, str or bytes")
+    
+    assert _parse_element_rows("<hierarchy rotation=\"0\" />") == []
+    print("✅ Empty hierarchy -> no elements")
+
+
+def test_element_batch():
+    print("\n=== Test ElementBatch ===")
+    
+    if ui_elements.np is None:
+        print("⏭️ numpy not installed, skipping")
+        return
+    
+    rows = _parse_element_rows(HIERARCHY)
+    batch = ElementBatch.from_rows(rows)
+    assert len(batch) == len(rows)
+    assert batch.to_element_nodes() == baseline_elements(HIERARCHY)
+    print("✅ from_rows -> to_element_nodes round-trips")
+    
+    names = batch.names
+    # Inside both the Row and its CheckBox: the smaller one wins
+    assert names[batch.element_at(950, 300)] == "CheckBox"
+    assert names[batch.element_at(100, 300)] == "Row"
+    assert names[batch.element_at(10, 20)] == "OK Confirm"  # Edges count
+    assert batch.element_at(500, 2300) is None
+    print("✅ element_at picks the smallest containing element")
+    
+    empty = ElementBatch.from_rows([])
+    assert len(empty) == 0 and empty.element_at(0, 0) is None
+    print("✅ Empty batch")
+
+
+if __name__ == "__main__":
+    test_parse_matches_baseline()
+    test_element_batch()
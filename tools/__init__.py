@@ -85,9 +85,21 @@ TOOL_REGISTRY = {
     "xpath_get_text": xpath_get_text,
 }
 
+# Tools that only read device state; any other tool call invalidates the
+# UI hierarchy cache (core.ui_cache)
+READ_ONLY_TOOLS = frozenset({
+    "take_screenshot", "get_ui_elements_info", "list_emulators", "get_device_dimensions",
+    "app_current", "app_info", "app_list", "get_clipboard", "get_orientation",
+    "get_toast", "get_element_info", "xpath_get_text",
+})
+
 # ========== Pydantic-validated tools ==========
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Optional
+
 from .schemas import TOOL_SCHEMAS
-from agent.tool_struct import StructuredTool
+from agent.tool_struct import StructuredTool, pydantic_to_openai_schema
 
 # Core tools with Pydantic validation
 CORE_TOOLS = [
@@ -109,5 +121,69 @@ for name in CORE_TOOLS:
 # List for Gemini SDK (auto function calling)
 GEMINI_TOOLS = [TOOL_REGISTRY[name] for name in CORE_TOOLS if name in TOOL_REGISTRY]
 
-__all__ = list(TOOL_REGISTRY.keys()) + ['TOOL_REGISTRY', 'STRUCTURED_TOOLS', 'GEMINI_TOOLS']
+
+# ========== Precomputed tool entries ==========
+
+@dataclass(frozen=True)
+class ToolEntry:
+    """Registered tool with its handler resolved once at import."""
+    name: str
+    func: Callable
+    handler: Callable  # StructuredTool (validated) or the raw function
+    args_schema: Optional[type]
+    
+    @cached_property
+    def openai_schema(self) -> dict:
+        """OpenAI function definition, generated on first access."""
+        description = getattr(self.func, '__doc__', f"Tool: {self.name}") or f"Tool: {self.name}"
+        description = description.split('\n')[0]
+        
+        parameters = (
+            pydantic_to_openai_schema(self.args_schema)
+            if self.args_schema
+            else {"type": "object", "properties": {}, "required": []}
+        )
+        
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": description,
+                "parameters": parameters
+            }
+        }
+
+
+def _build_tool_entry(name: str, func: Callable) -> ToolEntry:
+    return ToolEntry(
+        name=name,
+        func=func,
+        handler=STRUCTURED_TOOLS.get(name, func),
+        args_schema=TOOL_SCHEMAS.get(name)
+    )
+
+
+TOOL_ENTRIES = {name: _build_tool_entry(name, func) for name, func in TOOL_REGISTRY.items()}
+
+
+def _tool_alias(name: str) -> str:
+    return name.replace('_', '').replace('-', '').lower()
+
+
+# Case/separator-insensitive index, e.g. "take_screen_shot" -> take_screenshot
+_TOOL_ALIASES = {_tool_alias(name): name for name in TOOL_ENTRIES}
+
+
+def resolve_tool(name: str) -> Optional[ToolEntry]:
+    """Look up a tool entry, tolerating case and separator typos from the model."""
+    entry = TOOL_ENTRIES.get(name)
+    if entry is None:
+        canonical = _TOOL_ALIASES.get(_tool_alias(name))
+        entry = TOOL_ENTRIES[canonical] if canonical else None
+    return entry
+
+
+__all__ = list(TOOL_REGISTRY.keys()) + [
+    'TOOL_REGISTRY', 'READ_ONLY_TOOLS', 'STRUCTURED_TOOLS', 'GEMINI_TOOLS', 'TOOL_ENTRIES', 'ToolEntry', 'resolve_tool'
+]
 